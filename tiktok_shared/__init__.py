@@ -0,0 +1,8 @@
+# tiktok_shared/__init__.py
+"""
+tiktok_toolkit と tiktok_ugc_scraper で共有するモジュール。
+
+どちらもリポジトリ直下を sys.path に追加してから import する
+（tiktok_toolkit/tiktok.py の先頭と tiktok_ugc_scraper/src/modules/__init__.py）。
+PyInstaller でビルドするときは --paths でリポジトリ直下を指定すること。
+"""
@@ -0,0 +1,153 @@
+# tiktok_shared/driver_resolver.py
+"""
+chromedriver のパス解決（キャッシュ付き）。
+
+インストール済み Chrome のバージョンをローカルで調べ、対応する chromedriver の
+パスをマニフェストに保存する。Chrome のバージョンが変わるまではネットワークに
+つながずにそのパスを使い回す。
+
+tiktok_toolkit と tiktok_ugc_scraper の両方から使い、マニフェストも共有する。
+"""
+import os
+import re
+import json
+import time
+import logging
+import platform
+import subprocess
+
+
+def _cache_root() -> str:
+    override = os.environ.get('TIKTOK_DRIVER_CACHE_DIR')
+    if override:
+        return override
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'tiktok_scraper')
+
+
+MANIFEST_PATH = os.path.join(_cache_root(), 'chromedriver_manifest.json')
+
+_VERSION_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+)')
+
+
+def _version_from_registry() -> str | None:
+    try:
+        import winreg
+    except ImportError:
+        return None
+    keys = [
+        (winreg.HKEY_CURRENT_USER, r'Software\Google\Chrome\BLBeacon'),
+        (winreg.HKEY_LOCAL_MACHINE, r'Software\Google\Chrome\BLBeacon'),
+        (winreg.HKEY_LOCAL_MACHINE, r'Software\WOW6432Node\Google\Chrome\BLBeacon'),
+    ]
+    for hive, path in keys:
+        try:
+            with winreg.OpenKey(hive, path) as k:
+                value, _ = winreg.QueryValueEx(k, 'version')
+                if value:
+                    return str(value)
+        except OSError:
+            continue
+    return None
+
+
+def _chrome_binaries() -> list[str]:
+    system = platform.system()
+    if system == 'Windows':
+        roots = [os.environ.get(v) for v in ('PROGRAMFILES', 'PROGRAMFILES(X86)', 'LOCALAPPDATA')]
+        return [os.path.join(r, 'Google', 'Chrome', 'Application', 'chrome.exe') for r in roots if r]
+    if system == 'Darwin':
+        return ['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome']
+    return ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser']
+
+
+def detect_chrome_version() -> str | None:
+    """
+    インストール済み Chrome のバージョン（例: '131.0.6778.86'）をネットワークを使わずに調べる。
+
+    戻り値: バージョン文字列（見つからなければ None）
+    """
+    ver = _version_from_registry()
+    if ver:
+        return ver
+    for binary in _chrome_binaries():
+        if os.path.isabs(binary) and not os.path.exists(binary):
+            continue
+        if platform.system() == 'Windows':
+            # chrome.exe --version は Windows では何も出力しないため、実行ファイル横のバージョンフォルダを見る
+            try:
+                for name in os.listdir(os.path.dirname(binary)):
+                    if _VERSION_RE.fullmatch(name):
+                        return name
+            except OSError:
+                pass
+            continue
+        try:
+            out = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        m = _VERSION_RE.search(out or '')
+        if m:
+            return m.group(0)
+    return None
+
+
+def _load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f) or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    try:
+        os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+        tmp = f'{MANIFEST_PATH}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, MANIFEST_PATH)
+    except OSError as e:
+        logging.info(f'chromedriverマニフェストの保存に失敗: {e}')
+
+
+def _install_chromedriver() -> str:
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def resolve_chromedriver() -> str | None:
+    """
+    chromedriver のパスを返す。Chrome のバージョンがマニフェストと同じならキャッシュをそのまま使い、
+    変わっていれば webdriver_manager で取得し直してマニフェストを更新する。
+    取得に失敗した場合（オフライン等）は、前回のパスが残っていればそれを使う。
+
+    戻り値: chromedriver のパス（解決できなければ None）
+    """
+    manifest = _load_manifest()
+    cached = manifest.get('driver_path')
+    cached_ok = bool(cached) and os.path.isfile(cached)
+    chrome_version = detect_chrome_version()
+
+    if cached_ok and chrome_version and manifest.get('chrome_version') == chrome_version:
+        return cached
+    if cached_ok and not chrome_version:
+        logging.info(f'Chromeのバージョンを判定できないため、キャッシュ済みchromedriverを使用: {cached}')
+        return cached
+
+    try:
+        path = _install_chromedriver()
+    except Exception as e:
+        if cached_ok:
+            logging.warning(f'chromedriverの取得に失敗したため、キャッシュ済みのものを使用: {cached} | {e}')
+            return cached
+        logging.error(f'chromedriverの取得に失敗: {e}')
+        return None
+
+    _save_manifest({'chrome_version': chrome_version, 'driver_path': path,
+                    'resolved_at': time.strftime('%Y-%m-%d %H:%M:%S')})
+    logging.info(f'chromedriverを解決しました: Chrome {chrome_version} → {path}')
+    return path
@@ -0,0 +1,162 @@
+# tiktok_shared/net_blocking.py
+"""
+工程別のリクエストブロック（CDP Network.setBlockedURLs）。
+
+工程（UGC数取得・URL収集・動画詳細・ログイン確認）ごとに、使わないリソース
+（動画・フォント・解析ビーコン・画像など）のURLパターンを決めておき、ドライバに適用する。
+統計を有効にすると、パフォーマンスログから工程別のリクエスト数・転送量・ブロック数を集計する。
+ブロックしたリクエストの本来のサイズは分からないため、同じ種類のリソースの実測平均
+（まだ無ければ既定値）で見積もる。
+
+tiktok_toolkit と tiktok_ugc_scraper の両方から使う。
+"""
+import json
+import logging
+
+PATTERN_GROUPS = {
+    'images': [
+        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif",
+        "*.jpeg?*", "*.jpg?*", "*.webp?*", "*.png?*", "*.image?*", "*~tplv-*",
+    ],
+    'media': [
+        "*.mp4", "*.m4v", "*.mov", "*.m3u8", "*.ts", "*.avi", "*.wmv", "*.flv", "*.webm",
+        "*.mp3", "*.m4a", "*.mp4?*", "*.m3u8?*", "*/video/tos/*", "*mime_type=video_*",
+    ],
+    'fonts': ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.woff2?*", "*.woff?*"],
+    'analytics': [
+        "*google-analytics.com/*", "*googletagmanager.com/*", "*doubleclick.net/*",
+        "*/monitor_browser/collect/*", "*mon.tiktokv.com/*", "*mon-va.byteoversea.com/*",
+        "*analytics.tiktok.com/*", "*/web/report*",
+    ],
+}
+
+# 工程 → ブロックするグループ
+PHASE_GROUPS = {
+    # UGC数はページのテキストだけ読めればよい
+    'ugc_count': ('images', 'media', 'fonts', 'analytics'),
+    # 動画一覧のスクロール読み込みは画像の遅延読み込みに依存するので画像は通す
+    'url_harvest': ('media', 'fonts', 'analytics'),
+    # 動画詳細はリハイドレーションJSONから取る（アイコンは別途HTTPで取得）
+    'video_detail': ('images', 'media', 'fonts', 'analytics'),
+    # 手動ログイン（QRコード等）があり得るので画像は通す
+    'login_check': ('media', 'fonts', 'analytics'),
+}
+
+# 実測が無い種類の既定サイズ（バイト、見積もり用）
+DEFAULT_RESOURCE_BYTES = {
+    'Image': 40_000, 'Media': 800_000, 'Font': 60_000, 'Script': 80_000,
+    'XHR': 5_000, 'Fetch': 5_000, 'Ping': 500, 'Other': 10_000,
+}
+
+_stats: dict[str, dict[str, int]] = {}
+_type_bytes: dict[str, list[int]] = {}   # 種類 → [合計バイト, 件数]（ブロック分の見積もり用）
+_pending: dict[str, tuple[str, str]] = {}  # requestId → (工程, 種類)
+
+
+def policy_patterns(phase: str, overrides: dict | None = None, allow_groups=()) -> list[str]:
+    """
+    工程のブロック対象URLパターン。overrides に {工程: [パターン, ...]} があればそれで置き換える。
+
+    戻り値: パターンのリスト（空ならブロックしない）
+    """
+    if overrides and phase in overrides:
+        return list(overrides.get(phase) or [])
+    patterns = []
+    for group in PHASE_GROUPS.get(phase, ()):
+        if group not in allow_groups:
+            patterns.extend(PATTERN_GROUPS[group])
+    return patterns
+
+
+def enable_perf_logging(options):
+    """統計用にパフォーマンスログ（ネットワークのみ）を有効にする。ドライバ作成前に呼ぶこと。"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+
+def apply_blocking(driver, phase: str, overrides: dict | None = None,
+                   allow_groups=(), stats: bool = False) -> bool:
+    """
+    現在のタブに工程のブロックポリシーを適用する（タブごとに必要）。
+    stats=True はドライバ作成時に enable_perf_logging 済みであること。
+
+    戻り値: 適用できたか
+    """
+    patterns = policy_patterns(phase, overrides, allow_groups)
+    try:
+        driver._net_phase = phase
+        driver._net_stats = stats
+    except Exception:
+        pass
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        return True
+    except Exception as e:
+        logging.info(f"リソースブロック失敗（{phase}）: {e}")
+        return False
+
+
+def _phase_stats(phase: str) -> dict[str, int]:
+    return _stats.setdefault(phase, {'requests': 0, 'bytes': 0, 'blocked': 0, 'blocked_bytes_est': 0})
+
+
+def _estimate(rtype: str) -> int:
+    total, count = _type_bytes.get(rtype, (0, 0))
+    if count:
+        return total // count
+    return DEFAULT_RESOURCE_BYTES.get(rtype, DEFAULT_RESOURCE_BYTES['Other'])
+
+
+def collect_stats(driver):
+    """
+    パフォーマンスログを読み出して、ドライバの現在の工程に集計する（統計無効なら何もしない）。
+    ログはドライバ側に溜まり続けるので、ページ遷移ごと程度の間隔で呼ぶこと。
+    """
+    if not getattr(driver, '_net_stats', False):
+        return
+    phase = getattr(driver, '_net_phase', 'unknown')
+    try:
+        entries = driver.get_log('performance')
+    except Exception:
+        return
+    st = _phase_stats(phase)
+    for entry in entries:
+        try:
+            msg = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = msg.get('method')
+        params = msg.get('params') or {}
+        rid = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            _pending[rid] = (phase, params.get('type') or 'Other')
+            st['requests'] += 1
+        elif method == 'Network.loadingFinished':
+            req_phase, rtype = _pending.pop(rid, (phase, 'Other'))
+            size = int(params.get('encodedDataLength') or 0)
+            _phase_stats(req_phase)['bytes'] += size
+            acc = _type_bytes.setdefault(rtype, [0, 0])
+            acc[0] += size
+            acc[1] += 1
+        elif method == 'Network.loadingFailed':
+            req_phase, rtype = _pending.pop(rid, (phase, params.get('type') or 'Other'))
+            if params.get('blockedReason') == 'inspector':
+                bst = _phase_stats(req_phase)
+                bst['blocked'] += 1
+                bst['blocked_bytes_est'] += _estimate(params.get('type') or rtype)
+    if len(_pending) > 5000:
+        _pending.clear()
+
+
+def get_stats() -> dict[str, dict[str, int]]:
+    """戻り値: {工程: {requests, bytes, blocked, blocked_bytes_est}}（このプロセス分）"""
+    return {k: dict(v) for k, v in _stats.items()}
+
+
+def format_stats() -> str:
+    parts = []
+    for phase, st in sorted(_stats.items()):
+        parts.append(f"{phase}: 要求{st['requests']} 転送{st['bytes'] / 1_048_576:.1f}MB "
+                     f"ブロック{st['blocked']}(推定{st['blocked_bytes_est'] / 1_048_576:.1f}MB削減)")
+    return ' / '.join(parts)
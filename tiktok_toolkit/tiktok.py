@@ -8,14 +8,19 @@ import shutil
 import logging
 import threading
 import atexit
+import queue
+import hashlib
 import subprocess
 import platform
+
+# --startup-profile 用（ここから下の import とモジュール定義にかかった時間を測る）
+_IMPORT_T0 = time.perf_counter()
+_IMPORT_WALL0 = time.time()
 from datetime import datetime, timedelta
 from collections import deque
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, CancelledError, FIRST_COMPLETED, wait
 
-import pandas as pd
-import requests
 from openpyxl import load_workbook, Workbook
 
 from selenium import webdriver
@@ -28,10 +33,13 @@ from selenium.common.exceptions import (
     NoSuchElementException, TimeoutException, WebDriverException,
     StaleElementReferenceException
 )
-from webdriver_manager.chrome import ChromeDriverManager
 
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+# tiktok_ugc_scraper と共有するモジュール（リポジトリ直下の tiktok_shared/）
+_SHARED_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SHARED_ROOT not in sys.path:
+    sys.path.append(_SHARED_ROOT)
+from tiktok_shared.driver_resolver import resolve_chromedriver
+from tiktok_shared.net_blocking import apply_blocking, collect_stats, enable_perf_logging, format_stats
 
 try:
     from urllib3.exceptions import ProtocolError, MaxRetryError, ReadTimeoutError
@@ -56,23 +64,9 @@ def get_executable_dir():
 
 
 exec_dir = get_executable_dir()
-os.chdir(exec_dir)
-
 images_dir = os.path.join(exec_dir, 'images')
-os.makedirs(images_dir, exist_ok=True)
-
 BASE_USER_DATA_ROOT = os.path.join(exec_dir, 'chrome_profile', 'User Data')
 ISOLATED_USER_DATA_ROOT = os.path.join(exec_dir, 'chrome_profile', 'isolated')
-os.makedirs(BASE_USER_DATA_ROOT, exist_ok=True)
-os.makedirs(ISOLATED_USER_DATA_ROOT, exist_ok=True)
-
-logging.basicConfig(
-    filename=os.path.join(exec_dir, 'tiktok.log'),
-    filemode='a',
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    level=logging.INFO
-)
 
 
 def _rotate_logs(max_size_mb: int = 10, keep_days: int = 14):
@@ -88,8 +82,6 @@ def _rotate_logs(max_size_mb: int = 10, keep_days: int = 14):
         logging.warning(f'log rotation error: {e}')
 
 
-_rotate_logs()
-
 _DEFAULT_CFG = {
     "WEBDRIVER_CMD_TIMEOUT_SEC": 600,
     "SCRIPT_TIMEOUT_SEC": 180,
@@ -98,6 +90,29 @@ _DEFAULT_CFG = {
     "PARALLEL_ENABLED": False,
     "PARALLEL_WORKERS": 2,
     "CHROME_PROFILE_POOL": ["Default", "Profile 1"],
+    # ワーカー数の上限とリソースに応じた自動調整
+    "PARALLEL_WORKERS_MAX": 16,
+    "AUTO_PROVISION_PROFILES": True,
+    "CPU_CORES_PER_WORKER": 2,
+    "WORKER_MEM_MB": 1024,
+    "RESERVED_MEM_MB": 2048,
+    "MIN_FREE_MEM_MB": 1024,
+    # 機能2の並列時、1曲をこの行数ごとのタスクに分割する（0で分割しない）
+    "PARALLEL_CHUNK_ROWS": 300,
+    # 機能2の常駐ワーカーがブラウザを作り直すまでの処理タスク数（0で作り直さない）
+    "WORKER_RECYCLE_SONGS": 20,
+    # 所要時間履歴が無いときに見込む1URLあたりの秒数（並列の実行順序と完了予測に使う）
+    "DEFAULT_SEC_PER_URL": 4.0,
+    # 並列時、機能1と機能2を曲ごとにパイプラインで同時に進める（機能1+2のみ）
+    "PIPELINE_ENABLED": False,
+    # パイプライン時に機能1へ割り当てるワーカー数（残りは機能2）
+    "PIPELINE_F1_WORKERS": 1,
+    # 機能2の書き込みスレッドへ渡す行のキュー上限（満杯時はブラウザ側が待つ）
+    "WRITER_QUEUE_SIZE": 500,
+    # 前日以前のジャーナルで、日付シートが無く反映できないものを残す日数
+    "JOURNAL_KEEP_DAYS": 7,
+    # 機能2で次の動画ページを先読みするタブ数（1で先読みしない）
+    "PREFETCH_TABS": 1,
     "SONG_INTERVAL_MIN_SEC": 8,
     "SONG_INTERVAL_MAX_SEC": 15,
     "ERROR_PAGE_EXTRA_WAIT_SEC": 10,
@@ -105,7 +120,59 @@ _DEFAULT_CFG = {
     "LONG_WAIT_AFTER_ERRORS_SEC": 60,
     # 【追加】ログイン確認関連
     "CHECK_LOGIN_BEFORE_START": True,
+    # ログイン確認をまずプロファイルのCookieファイルで行い、判定できない時だけブラウザで確認する
+    "OFFLINE_LOGIN_CHECK": True,
+    # 工程別のリクエストブロック（動画・フォント・解析ビーコン等、tiktok_shared/net_blocking.py 参照）
+    "NET_BLOCKING_ENABLED": True,
+    # 工程ごとのブロックパターンの上書き（例: {"url_harvest": ["*.mp4", "*.woff2"]}、空リストでブロックなし）
+    "NET_BLOCK_POLICIES": {},
+    # 工程別の通信量・ブロック数を集計してログに出す（パフォーマンスログを使うので計測時のみ推奨）
+    "NET_BLOCK_STATS": False,
+    # ChromeのHTTPキャッシュ上限（MB）。0 で従来どおりほぼ無効
+    "CHROME_DISK_CACHE_MB": 256,
+    # キャッシュ有効時、JS/CSSバンドル等の入ったキャッシュを新しい分離プロファイルに複製する
+    "WARM_CACHE_SEED": True,
+    # ウォームキャッシュを作り直す間隔（時間）
+    "WARM_CACHE_REFRESH_HOURS": 24,
+    # 全Chromeに渡す --proxy-server（例: "http://127.0.0.1:3128"、空で使わない）
+    "CHROME_PROXY_SERVER": "",
+    # 機能2の工程別トレース（traces/ にJSONL、終了時に分位点レポート）
+    "TRACE_ENABLED": True,
+    # トレースを残す日数
+    "TRACE_KEEP_DAYS": 14,
+    # GUIのログ表示に残す行数と、まとめて表示する間隔（ミリ秒）
+    "GUI_LOG_MAX_LINES": 5000,
+    "GUI_LOG_DRAIN_MS": 200,
+    # 削除・非公開の表示が続いた投稿を記録し、しばらく取得をスキップする
+    "DEAD_POST_CACHE_ENABLED": True,
+    # 何回続けて削除・非公開の表示になったらスキップするか
+    "DEAD_POST_THRESHOLD": 3,
+    # スキップ中の投稿を開き直して確認する間隔（日）
+    "DEAD_POST_REPROBE_DAYS": 7,
+    # 分離プロファイルを /dev/shm（RAM）上に作る（Linuxのみ。再起動で消えテンプレートから再作成）
+    "PROFILE_TMPFS": False,
+    # 分離プロファイルのキャッシュ類を削除する間隔（時間、0で無効）
+    "PROFILE_COMPACT_HOURS": 24,
     "LOGIN_WAIT_TIMEOUT_SEC": 120,
+    # アイコン取得（バックグラウンド）
+    "AVATAR_DOWNLOAD_WORKERS": 2,
+    "AVATAR_QUEUE_SIZE": 200,
+    "AVATAR_REVALIDATE_HOURS": 24,
+    "AVATAR_FLUSH_TIMEOUT_SEC": 30,
+    # プロフィール取得を曲の最後にまとめて行う
+    "DEFER_PROFILE_LOOKUPS": True,
+    # 保存失敗（ファイルロック等）時の再試行
+    "SAVE_RETRY_COUNT": 12,
+    "SAVE_RETRY_INTERVAL_SEC": 5,
+    # 段階的な再取得ポリシー（機能2）
+    "REFRESH_POLICY_ENABLED": True,
+    "REFRESH_HISTORY_SHEETS": 7,
+    "REFRESH_RECENT_DAYS": 14,
+    "REFRESH_SLOW_INTERVAL_DAYS": 7,
+    "REFRESH_FAST_GROWTH_RATE": 0.05,
+    # 機能1の差分収集（既知の投稿が続いたらスクロール終了）
+    "INCREMENTAL_COLLECT": False,
+    "INCREMENTAL_STOP_AFTER_KNOWN": 30,
 }
 
 
@@ -131,19 +198,158 @@ def _load_runtime_config() -> dict:
               "PER_SONG_TIME_BUDGET_SEC", "PARALLEL_WORKERS",
               "SONG_INTERVAL_MIN_SEC", "SONG_INTERVAL_MAX_SEC",
               "ERROR_PAGE_EXTRA_WAIT_SEC", "MAX_CONSECUTIVE_ERRORS",
-              "LONG_WAIT_AFTER_ERRORS_SEC", "LOGIN_WAIT_TIMEOUT_SEC"]:
+              "LONG_WAIT_AFTER_ERRORS_SEC", "LOGIN_WAIT_TIMEOUT_SEC",
+              "AVATAR_DOWNLOAD_WORKERS", "AVATAR_QUEUE_SIZE", "AVATAR_REVALIDATE_HOURS",
+              "AVATAR_FLUSH_TIMEOUT_SEC", "SAVE_RETRY_COUNT", "SAVE_RETRY_INTERVAL_SEC",
+              "REFRESH_HISTORY_SHEETS", "REFRESH_RECENT_DAYS", "REFRESH_SLOW_INTERVAL_DAYS",
+              "INCREMENTAL_STOP_AFTER_KNOWN", "PARALLEL_WORKERS_MAX", "CPU_CORES_PER_WORKER",
+              "WORKER_MEM_MB", "RESERVED_MEM_MB", "MIN_FREE_MEM_MB", "PARALLEL_CHUNK_ROWS",
+              "WORKER_RECYCLE_SONGS", "PIPELINE_F1_WORKERS",
+              "WRITER_QUEUE_SIZE", "JOURNAL_KEEP_DAYS", "PREFETCH_TABS", "PROFILE_COMPACT_HOURS",
+              "CHROME_DISK_CACHE_MB", "WARM_CACHE_REFRESH_HOURS", "TRACE_KEEP_DAYS",
+              "GUI_LOG_MAX_LINES", "GUI_LOG_DRAIN_MS", "DEAD_POST_THRESHOLD"]:
         try:
             cfg[k] = int(cfg.get(k, _DEFAULT_CFG.get(k, 0)))
         except Exception:
             cfg[k] = _DEFAULT_CFG.get(k, 0)
+    for k in ["REFRESH_FAST_GROWTH_RATE", "DEFAULT_SEC_PER_URL", "DEAD_POST_REPROBE_DAYS"]:
+        try:
+            cfg[k] = float(cfg.get(k, _DEFAULT_CFG[k]))
+        except Exception:
+            cfg[k] = _DEFAULT_CFG[k]
     try:
-        cfg["PARALLEL_WORKERS"] = max(1, min(int(cfg.get("PARALLEL_WORKERS", 2)), 2))
+        cfg["PARALLEL_WORKERS"] = max(1, min(int(cfg.get("PARALLEL_WORKERS", 2)),
+                                             max(1, int(cfg.get("PARALLEL_WORKERS_MAX", 16)))))
     except Exception:
         cfg["PARALLEL_WORKERS"] = 2
     return cfg
 
 
-CFG = _load_runtime_config()
+# _bootstrap() で config.json を読み込むまでは既定値
+CFG: dict = dict(_DEFAULT_CFG)
+_BOOTSTRAP_PID = None
+_BOOT_TIMINGS: dict[str, float] = {}
+_log_queue = None
+_log_listener = None
+
+
+def _log_formatter() -> logging.Formatter:
+    return logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def _setup_logging(worker: bool, log_queue=None):
+    """
+    メイン: ログは QueueHandler でキューに積むだけにし、tiktok.log への書き込みは
+    QueueListener のスレッドが行う。ワーカーもこのキュー（multiprocessing.Queue）へ送る。
+    ワーカー: log_queue があればそこへ送るだけ（ファイルには触れない）。
+    """
+    import logging.handlers
+    global _log_queue, _log_listener
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.setLevel(logging.INFO)
+    if worker and log_queue is not None:
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        return
+    file_handler = logging.FileHandler(os.path.join(exec_dir, 'tiktok.log'), mode='a')
+    file_handler.setFormatter(_log_formatter())
+    if worker:
+        root.addHandler(file_handler)
+        return
+
+    import multiprocessing as mp
+    _log_queue = mp.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(_log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    root.addHandler(logging.handlers.QueueHandler(_log_queue))
+    atexit.register(_stop_log_listener)
+
+
+def _stop_log_listener(timeout: float = 5.0):
+    """
+    リスナーを止める。強制終了したワーカーがキューを壊していると stop() が戻らないことが
+    あるので、別スレッドで呼んで timeout 秒だけ待つ。
+    """
+    global _log_listener
+    if _log_listener is not None:
+        stopper = threading.Thread(target=_log_listener.stop, daemon=True)
+        stopper.start()
+        stopper.join(timeout)
+        if stopper.is_alive() and sys.stderr is not None:
+            # ロガー自体が止まっているので標準エラーへ出す（GUI版では stderr が無い）
+            sys.stderr.write('ログの書き出しが終わらないため打ち切りました\n')
+        _log_listener = None
+    if _log_queue is not None:
+        # 終了時にキューの送信スレッドの完了を待たない（読み手はもういない）
+        try:
+            _log_queue.cancel_join_thread()
+        except Exception:
+            pass
+
+
+def add_log_handler(handler: logging.Handler):
+    """ログの出力先を追加する（リスナーがあればリスナー側のスレッドで処理される）。"""
+    if _log_listener is not None:
+        _log_listener.handlers = _log_listener.handlers + (handler,)
+    else:
+        logging.getLogger().addHandler(handler)
+
+
+def _bootstrap(worker: bool = False, log_queue=None) -> bool:
+    """
+    実行時の初期化（作業ディレクトリ・ログ設定・設定読込、メインではログローテーションと
+    ディレクトリ作成も）。import しただけでは行わないので、__main__ と各ワーカーの入口で呼ぶ。
+    ワーカーでは親が済ませたローテーションとディレクトリ作成を省き、ログは log_queue
+    （親の _log_queue）へ送る。
+
+    戻り値: このプロセスで初めて初期化したか
+    """
+    global _BOOTSTRAP_PID
+    if _BOOTSTRAP_PID == os.getpid():
+        return False
+    _BOOTSTRAP_PID = os.getpid()
+    t0 = time.perf_counter()
+    os.chdir(exec_dir)
+    _setup_logging(worker, log_queue)
+    if not worker:
+        _rotate_logs()
+        for d in (images_dir, BASE_USER_DATA_ROOT, ISOLATED_USER_DATA_ROOT):
+            os.makedirs(d, exist_ok=True)
+    CFG.clear()
+    CFG.update(_load_runtime_config())
+    _BOOT_TIMINGS['bootstrap'] = time.perf_counter() - t0
+    return True
+
+
+def _worker_bootstrap(log_queue, label: str):
+    if _bootstrap(worker=True, log_queue=log_queue):
+        report_startup(label)
+
+
+def startup_profile_enabled() -> bool:
+    # 子プロセスにも伝わるよう環境変数で持つ
+    return os.environ.get('TIKTOK_STARTUP_PROFILE') == '1'
+
+
+def report_startup(label: str, extra: dict[str, float] | None = None):
+    """
+    --startup-profile 指定時、このプロセスの起動内訳をログに出す
+    （interpreter: プロセス生成→本モジュールの読込開始、import: 本モジュールの読込）。
+    """
+    if not startup_profile_enabled():
+        return
+    parts: dict[str, float] = {}
+    if psutil:
+        try:
+            parts['interpreter'] = _IMPORT_WALL0 - psutil.Process().create_time()
+        except Exception:
+            pass
+    parts['import'] = _IMPORT_SEC
+    parts.update(_BOOT_TIMINGS)
+    parts.update(extra or {})
+    logging.info(f'[起動計測] {label} pid={os.getpid()} '
+                 + ', '.join(f'{k}={v:.2f}s' for k, v in parts.items()))
 
 stop_flag = threading.Event()
 external_stop = None
@@ -187,22 +393,45 @@ def is_service_like_session() -> bool:
 
 
 class TextHandler(logging.Handler):
-    def __init__(self, text_widget, log_display_var):
+    """
+    GUIのログ表示。emit はバッファに積むだけで（リスナーのスレッドから呼ばれる）、
+    Tk 側のタイマーが drain_ms ごとにまとめて挿入する。表示は max_lines 行まで。
+    """
+
+    def __init__(self, text_widget, log_display_var, max_lines: int = 5000, drain_ms: int = 200):
         super().__init__()
         self.text_widget = text_widget
         self.log_display_var = log_display_var
+        self.max_lines = max(100, int(max_lines))
+        self.drain_ms = max(20, int(drain_ms))
+        self._buf: deque[str] = deque(maxlen=self.max_lines)
 
     def emit(self, record):
-        if self.log_display_var.get():
-            msg = self.format(record)
+        try:
+            self._buf.append(self.format(record))
+        except Exception:
+            self.handleError(record)
 
-            def append():
-                self.text_widget.configure(state='normal')
-                self.text_widget.insert(tk.END, msg + '\n')
-                self.text_widget.configure(state='disabled')
-                self.text_widget.yview(tk.END)
+    def start(self):
+        self.text_widget.after(self.drain_ms, self._drain)
 
-            self.text_widget.after(0, append)
+    def _drain(self):
+        lines = []
+        while self._buf:
+            try:
+                lines.append(self._buf.popleft())
+            except IndexError:
+                break
+        if lines and self.log_display_var.get():
+            w = self.text_widget
+            w.configure(state='normal')
+            w.insert('end', '\n'.join(lines) + '\n')
+            excess = int(w.index('end-1c').split('.')[0]) - self.max_lines
+            if excess > 0:
+                w.delete('1.0', f'{excess + 1}.0')
+            w.configure(state='disabled')
+            w.yview('end')
+        self.text_widget.after(self.drain_ms, self._drain)
 
 
 def ensure_dir(path: str):
@@ -260,6 +489,7 @@ def resolve_settings_path(user_specified: str | None) -> str:
         if os.path.exists(p):
             return os.path.abspath(p)
     if (len(sys.argv) == 1 or sys.argv[1] != 'run') and not is_service_like_session():
+        from tkinter import filedialog
         p = filedialog.askopenfilename(
             title='initial_settings.xlsx を選択してください',
             filetypes=[('Excel Files', '*.xlsx *.xlsm *.xltx *.xltm')]
@@ -270,7 +500,10 @@ def resolve_settings_path(user_specified: str | None) -> str:
 
 
 def read_initial_settings(settings_path: str | None = None):
+    t0 = time.perf_counter()
     try:
+        # pandas は重いので初期設定の読み込み時だけ import する
+        import pandas as pd
         resolved = resolve_settings_path(settings_path)
         logging.info(f'初期設定Excel: {resolved}')
         df_settings = pd.read_excel(resolved, sheet_name='初期設定', header=None)
@@ -290,10 +523,12 @@ def read_initial_settings(settings_path: str | None = None):
         df_urls['URL'] = df_urls['URL'].astype(str) \
             .str.replace(r'^\s*ttps://', 'https://', regex=True) \
             .str.replace(r'[\r\n]+', '', regex=True)
+        _BOOT_TIMINGS['settings'] = time.perf_counter() - t0
         return save_path, max_items, df_urls[['曲名', 'URL']].values.tolist()
     except Exception as e:
         logging.error(f'初期設定の読み込み中にエラー: {e}')
         try:
+            from tkinter import messagebox
             messagebox.showerror('エラー', f'初期設定の読み込み中にエラーが発生しました: {e}')
         except Exception:
             pass
@@ -332,10 +567,11 @@ def kill_chrome_processes():
 
     try:
         targets = []
-        marker_paths = set(launched_user_dirs + [ISOLATED_USER_DATA_ROOT])
+        # PROFILE_TMPFS 有効時の分離プロファイルは /dev/shm 側にある
+        marker_paths = set(launched_user_dirs + [ISOLATED_USER_DATA_ROOT, PROFILE_TMPFS_ROOT])
         for p in psutil.process_iter(['name', 'cmdline']):
             nm = (p.info.get('name') or '').lower()
-            if nm not in ('chrome.exe', 'chromedriver.exe'):
+            if nm.removesuffix('.exe') not in ('chrome', 'chromedriver'):
                 continue
             if _cmdline_contains_any(p, [str(m) for m in marker_paths]) or _cmdline_contains_any(p, ['--remote-debugging-port=0']):
                 targets.append(p)
@@ -378,39 +614,266 @@ def force_kill_all_processes():
 atexit.register(kill_chrome_processes)
 
 
-def _copytree_safe(src: str, dst: str):
+PROFILE_LOCK_PATTERNS = [
+    'Singleton*', 'LOCK', 'Lockfile', 'Visited Links', 'Current Tabs',
+    'Current Session', 'Last Tabs', 'Last Session', 'Crashpad', 'Code Cache'
+]
+# テンプレートとコンパクションで除外する再生成可能なキャッシュ類
+PROFILE_PRUNE_PATTERNS = [
+    'Cache', 'Code Cache', 'GPUCache', 'Service Worker', 'DawnCache', 'DawnGraphiteCache',
+    'DawnWebGPUCache', 'GrShaderCache', 'ShaderCache', 'GraphiteDawnCache', 'blob_storage',
+    'Crashpad', 'Media Cache', 'optimization_guide_hint_cache_store', 'Download Service'
+]
+# Chrome が中身を書き換えない（バージョンごとに作り直す）のでハードリンクしてよいディレクトリ
+PROFILE_HARDLINK_SAFE_DIRS = ('Extensions',)
+PROFILE_TEMPLATE_ROOT = os.path.join(exec_dir, 'chrome_profile', 'template')
+PROFILE_TMPFS_ROOT = '/dev/shm/tiktok_toolkit_profiles'
+# ウォームキャッシュ（JS/CSSバンドル等）のスナップショット。新しい分離プロファイルに複製する
+WARM_CACHE_DIR = os.path.join(exec_dir, 'chrome_profile', 'warm_cache')
+# 更新ロックがこれより古ければ、更新中に落ちたワーカーの残骸とみなして取り除く
+WARM_CACHE_LOCK_STALE_SEC = 30 * 60
+
+
+def _match_any(name: str, patterns) -> bool:
+    return any(re.fullmatch(pat.replace('*', '.*'), name) for pat in patterns)
+
+
+def _copytree_safe(src: str, dst: str, extra_ignore=()):
+    patterns = PROFILE_LOCK_PATTERNS + list(extra_ignore)
+
     def _ignore(_dir, names):
-        ignore_patterns = [
-            'Singleton*', 'LOCK', 'Lockfile', 'Visited Links', 'Current Tabs',
-            'Current Session', 'Last Tabs', 'Last Session', 'Crashpad', 'Code Cache'
-        ]
-        res = []
-        for n in names:
-            for pat in ignore_patterns:
-                if re.fullmatch(pat.replace('*', '.*'), n):
-                    res.append(n)
-                    break
-        return set(res)
+        return {n for n in names if _match_any(n, patterns)}
 
     shutil.copytree(src, dst, dirs_exist_ok=True, ignore=_ignore)
 
 
-def seed_isolated_profile(profile_name: str, isolated_ud_dir: str):
+def _clone_file(src: str, dst: str) -> str:
+    """
+    可能ならリフリンク（コピーオンライト）で複製し、できなければ通常コピーする。
+
+    戻り値: 'reflink' / 'copy'
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            import fcntl
+            with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+                fcntl.ioctl(fd.fileno(), 0x40049409, fs.fileno())  # FICLONE
+            shutil.copystat(src, dst)
+            return 'reflink'
+        except (OSError, ImportError):
+            pass
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def _materialize_profile(template: str, dst: str) -> dict[str, int]:
+    """
+    テンプレートからプロファイルを作る。書き換えられないディレクトリはハードリンク、
+    それ以外はリフリンク（不可なら通常コピー）で複製する。
+
+    戻り値: 方式ごとのファイル数
+    """
+    stats = {'hardlink': 0, 'reflink': 0, 'copy': 0}
+    for root, _dirs, files in os.walk(template):
+        rel = os.path.relpath(root, template)
+        top = rel.split(os.sep)[0]
+        ensure_dir(os.path.join(dst, rel))
+        for name in files:
+            src_file = os.path.join(root, name)
+            dst_file = os.path.join(dst, rel, name)
+            if os.path.lexists(dst_file):
+                os.remove(dst_file)
+            if top in PROFILE_HARDLINK_SAFE_DIRS:
+                try:
+                    os.link(src_file, dst_file)
+                    stats['hardlink'] += 1
+                    continue
+                except OSError:
+                    pass
+            stats[_clone_file(src_file, dst_file)] += 1
+    return stats
+
+
+def _profile_source_stamp(src_profile: str) -> float:
+    stamps = []
+    for rel in ('Preferences', os.path.join('Network', 'Cookies'), 'Cookies', 'Login Data'):
+        try:
+            stamps.append(os.path.getmtime(os.path.join(src_profile, rel)))
+        except OSError:
+            pass
+    return max(stamps) if stamps else 0.0
+
+
+def ensure_profile_template(source_name: str) -> str | None:
+    """
+    シード元プロファイルからキャッシュ類を除いたテンプレートを用意する。
+    シード元のCookie/設定が更新されていれば作り直す。
+
+    戻り値: テンプレートのパス（シード元が無ければ None）
+    """
+    src_profile = os.path.join(BASE_USER_DATA_ROOT, source_name)
+    if not os.path.isdir(src_profile):
+        return None
+    template = os.path.join(PROFILE_TEMPLATE_ROOT, sanitize_filename(source_name))
+    stamp_file = os.path.join(PROFILE_TEMPLATE_ROOT, f'{sanitize_filename(source_name)}.stamp')
+    src_stamp = _profile_source_stamp(src_profile)
+    try:
+        with open(stamp_file, 'r', encoding='utf-8') as f:
+            if os.path.isdir(template) and float(f.read().strip() or 0) >= src_stamp:
+                return template
+    except (OSError, ValueError):
+        pass
+
+    logging.info(f'プロファイルテンプレート作成: {source_name}')
+    shutil.rmtree(template, ignore_errors=True)
+    _copytree_safe(src_profile, template, extra_ignore=PROFILE_PRUNE_PATTERNS)
+    with open(stamp_file, 'w', encoding='utf-8') as f:
+        f.write(str(src_stamp))
+    return template
+
+
+def compact_profile(isolated_ud_dir: str, force: bool = False) -> int:
+    """
+    長く使っている分離プロファイルからキャッシュ類を削除する（PROFILE_COMPACT_HOURS ごと）。
+    起動前（そのプロファイルを誰も使っていない時）に呼ぶこと。
+
+    戻り値: 削除したディレクトリ数
+    """
+    hours = int(CFG.get("PROFILE_COMPACT_HOURS", 24))
+    marker = os.path.join(isolated_ud_dir, '.COMPACTED')
+    if hours <= 0 and not force:
+        return 0
+    try:
+        if not force and time.time() - os.path.getmtime(marker) < hours * 3600:
+            return 0
+    except OSError:
+        pass
+
+    patterns = PROFILE_PRUNE_PATTERNS
+    if _warm_cache_enabled():
+        # HTTPキャッシュは CHROME_DISK_CACHE_MB で上限が決まっているので残す
+        patterns = [p for p in patterns if p != 'Cache']
+    removed = 0
+    for root, dirs, _files in os.walk(isolated_ud_dir):
+        for d in list(dirs):
+            if _match_any(d, patterns):
+                shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+                dirs.remove(d)
+                removed += 1
+    try:
+        with open(marker, 'w', encoding='utf-8') as f:
+            f.write(datetime.now().strftime('%Y/%m/%d %H:%M'))
+    except OSError:
+        pass
+    if removed:
+        logging.info(f'プロファイルをコンパクション: {isolated_ud_dir} ({removed}ディレクトリ削除)')
+    return removed
+
+
+def _warm_cache_enabled() -> bool:
+    return int(CFG.get("CHROME_DISK_CACHE_MB", 0)) > 0 and bool(CFG.get("WARM_CACHE_SEED", True))
+
+
+def seed_warm_cache(dst_profile: str) -> bool:
+    """
+    HTTPキャッシュが空のプロファイルにウォームキャッシュを複製する。
+
+    戻り値: 複製したか
+    """
+    src = os.path.join(WARM_CACHE_DIR, 'Cache')
+    dst = os.path.join(dst_profile, 'Cache')
+    if not _warm_cache_enabled() or not os.path.isdir(src) or os.path.isdir(dst):
+        return False
+    try:
+        stats = _materialize_profile(src, dst)
+        logging.info(f'ウォームキャッシュを複製 ({_format_counts(stats)})')
+        return True
+    except Exception as e:
+        logging.info(f'ウォームキャッシュの複製に失敗: {e}')
+        shutil.rmtree(dst, ignore_errors=True)
+        return False
+
+
+def snapshot_warm_cache(isolated_ud_dir: str):
+    """
+    終了したプロファイルのHTTPキャッシュをウォームキャッシュとして保存する
+    （WARM_CACHE_REFRESH_HOURS より古い場合のみ。Chrome終了後に呼ぶこと）。
+    """
+    if not _warm_cache_enabled():
+        return
+    src = os.path.join(isolated_ud_dir, 'Default', 'Cache')
+    dst = os.path.join(WARM_CACHE_DIR, 'Cache')
+    # 複製で元のディレクトリの更新時刻が引き継がれるので、更新時刻は別ファイルで管理する
+    marker = os.path.join(WARM_CACHE_DIR, '.UPDATED')
+    try:
+        if time.time() - os.path.getmtime(marker) < int(CFG.get("WARM_CACHE_REFRESH_HOURS", 24)) * 3600:
+            return
+    except OSError:
+        pass
+    if not os.path.isdir(src):
+        return
+    lock = os.path.join(WARM_CACHE_DIR, '.lock')
+    try:
+        ensure_dir(WARM_CACHE_DIR)
+        if time.time() - os.path.getmtime(lock) > WARM_CACHE_LOCK_STALE_SEC:
+            logging.info(f'古いウォームキャッシュ更新ロックを削除: {lock}')
+            os.rmdir(lock)
+    except OSError:
+        pass
+    try:
+        os.mkdir(lock)  # 他のワーカーが更新中なら今回は見送る
+    except OSError:
+        return
+    try:
+        tmp = os.path.join(WARM_CACHE_DIR, f'Cache.{os.getpid()}.tmp')
+        shutil.rmtree(tmp, ignore_errors=True)
+        _copytree_safe(src, tmp)
+        shutil.rmtree(dst, ignore_errors=True)
+        os.replace(tmp, dst)
+        with open(marker, 'w', encoding='utf-8') as f:
+            f.write(datetime.now().strftime('%Y/%m/%d %H:%M'))
+        logging.info(f'ウォームキャッシュを更新: {src}')
+    except Exception as e:
+        logging.info(f'ウォームキャッシュの更新に失敗: {e}')
+    finally:
+        try:
+            os.rmdir(lock)
+        except OSError:
+            pass
+
+
+def isolated_user_data_dir(profile_name: str) -> str:
+    """
+    分離プロファイルの user-data-dir。PROFILE_TMPFS が有効で /dev/shm があればRAM上に置く
+    （再起動で消えるので、その都度テンプレートから作り直される）。
+    """
+    root = ISOLATED_USER_DATA_ROOT
+    if bool(CFG.get("PROFILE_TMPFS", False)) and os.path.isdir('/dev/shm'):
+        root = PROFILE_TMPFS_ROOT
+    return os.path.abspath(os.path.join(root, sanitize_filename(profile_name)))
+
+
+def seed_isolated_profile(profile_name: str, isolated_ud_dir: str, source_profile: str | None = None):
     try:
         marker = os.path.join(isolated_ud_dir, '.SEEDED_OK')
         dst_profile = os.path.join(isolated_ud_dir, 'Default')
         if os.path.exists(marker) and os.path.isdir(dst_profile):
+            compact_profile(isolated_ud_dir)
+            seed_warm_cache(dst_profile)
             return
 
-        src_profile = os.path.join(BASE_USER_DATA_ROOT, profile_name)
-        if not os.path.isdir(src_profile):
-            logging.warning(f'シード元プロファイルが見つかりません: {src_profile}（未ログインで起動します）')
+        profile_name = source_profile or profile_name
+        template = ensure_profile_template(profile_name)
+        if not template:
+            logging.warning(f'シード元プロファイルが見つかりません: {os.path.join(BASE_USER_DATA_ROOT, profile_name)}'
+                            '（未ログインで起動します）')
             ensure_dir(dst_profile)
         else:
             logging.info(f'プロファイルシード開始: {profile_name} -> {dst_profile}')
             ensure_dir(isolated_ud_dir)
-            _copytree_safe(src_profile, dst_profile)
-            logging.info('プロファイルシード完了')
+            stats = _materialize_profile(template, dst_profile)
+            logging.info(f'プロファイルシード完了 ({_format_counts(stats)})')
+        seed_warm_cache(dst_profile)
 
         local_state_src = os.path.join(BASE_USER_DATA_ROOT, 'Local State')
         if os.path.isfile(local_state_src):
@@ -428,6 +891,7 @@ def seed_isolated_profile(profile_name: str, isolated_ud_dir: str):
 def init_driver(headless: bool = False, per_song_timeout: int = 300,
                 for_function1: bool = False, profile_name: str | None = None,
                 chromedriver_path: str | None = None,
+                net_phase: str | None = None,
                 _is_retry: bool = False):
     if is_service_like_session() and not headless:
         logging.info('サービス/スケジューラっぽいセッションのため、Chrome を headless モードで起動します。')
@@ -437,9 +901,14 @@ def init_driver(headless: bool = False, per_song_timeout: int = 300,
 
     prefs = {
         "profile.managed_default_content_settings.images": 1 if for_function1 else 2,
-        "disk-cache-size": 4096
     }
     chrome_options.add_experimental_option("prefs", prefs)
+    cache_mb = int(CFG.get("CHROME_DISK_CACHE_MB", 0))
+    # 0 のときは従来どおりキャッシュをほぼ無効にする
+    chrome_options.add_argument(f"--disk-cache-size={cache_mb * 1024 * 1024 if cache_mb > 0 else 4096}")
+    proxy = str(CFG.get("CHROME_PROXY_SERVER") or '').strip()
+    if proxy:
+        chrome_options.add_argument(f"--proxy-server={proxy}")
     if headless:
         chrome_options.add_argument("--headless=new")
 
@@ -459,9 +928,11 @@ def init_driver(headless: bool = False, per_song_timeout: int = 300,
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
     chrome_options.set_capability("pageLoadStrategy", "none")
+    if bool(CFG.get("NET_BLOCK_STATS", False)):
+        enable_perf_logging(chrome_options)
 
     if profile_name:
-        ud_dir = os.path.abspath(os.path.join(ISOLATED_USER_DATA_ROOT, f'{sanitize_filename(profile_name)}'))
+        ud_dir = isolated_user_data_dir(profile_name)
         ensure_dir(ud_dir)
         seed_isolated_profile(profile_name, ud_dir)
         chrome_options.add_argument(f'--user-data-dir={ud_dir}')
@@ -479,7 +950,7 @@ def init_driver(headless: bool = False, per_song_timeout: int = 300,
             service = Service(executable_path=chromedriver_path)
             logging.info(f'Using provided chromedriver: {chromedriver_path}')
         else:
-            service = Service(ChromeDriverManager().install())
+            service = Service(executable_path=resolve_chromedriver())
         
         driver = webdriver.Chrome(service=service, options=chrome_options)
         driver.set_window_size(1420, 1080)
@@ -496,6 +967,7 @@ def init_driver(headless: bool = False, per_song_timeout: int = 300,
             driver.execute_script("document.body.style.zoom='90%'")
         except Exception:
             pass
+        apply_net_policy(driver, net_phase or ('url_harvest' if for_function1 else 'video_detail'))
         if driver.service and driver.service.process:
             webdriver_processes.append(driver.service.process.pid)
         try:
@@ -518,32 +990,39 @@ def init_driver(headless: bool = False, per_song_timeout: int = 300,
                 for_function1=for_function1,
                 profile_name=profile_name,
                 chromedriver_path=chromedriver_path,
+                net_phase=net_phase,
                 _is_retry=True
             )
         try:
+            from tkinter import messagebox
             messagebox.showerror('エラー', f'WebDriverの初期化に失敗しました: {msg}')
         except Exception:
             pass
         return None
 
 
-def enable_speed_blocking(driver):
-    try:
-        driver.execute_cdp_cmd("Network.enable", {})
-        patterns = [
-            "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
-            "*.mp4", "*.m4v", "*.mov", "*.m3u8", "*.ts", "*.avi", "*.wmv", "*.flv", "*.webm",
-            "*.woff", "*.woff2", "*.ttf", "*.otf"
-        ]
-        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
-        logging.info("[機能2] 重いリソースをブロックしました")
-    except Exception as e:
-        logging.info(f"[機能2] リソースブロック失敗: {e}")
+def apply_net_policy(driver, phase: str):
+    """
+    現在のタブに工程別のリクエストブロックを適用する（net_blocking 参照）。
+    新しく開いたタブ・ウィンドウにはその都度呼ぶこと。
+    """
+    if not bool(CFG.get("NET_BLOCKING_ENABLED", True)):
+        return
+    apply_blocking(driver, phase, CFG.get("NET_BLOCK_POLICIES") or None,
+                   stats=bool(CFG.get("NET_BLOCK_STATS", False)))
+
+
+def log_net_stats(label: str):
+    if bool(CFG.get("NET_BLOCK_STATS", False)):
+        summary = format_stats()
+        if summary:
+            logging.info(f'[{label}] 通信量（このプロセスの累計）: {summary}')
 
 
 def safe_quit(driver):
     try:
         if driver:
+            collect_stats(driver)
             driver.quit()
     except Exception:
         pass
@@ -693,6 +1172,7 @@ def ensure_logged_in(driver, headless: bool = False) -> bool:
     
     # GUIでダイアログを表示
     try:
+        from tkinter import messagebox
         result = messagebox.askyesno(
             'TikTok ログイン確認',
             'TikTokにログインしていません。\n\n'
@@ -721,59 +1201,111 @@ ERROR_XPATHS_STRICT = [
     '//p[contains(text(), "動画は現在ご利用できません")]',
     '//div[contains(@class, "error") and contains(text(), "エラー")]',
 ]
+# 投稿が削除・非公開になったときの表示（一時的なエラーと区別して、消えた投稿の記録に使う）
+ERROR_XPATHS_GONE = [
+    '//p[contains(text(), "ページを表示できません")]',
+    '//p[contains(text(), "動画は現在ご利用できません")]',
+]
 
 
-def _detect_error_page(driver) -> bool:
-    try:
-        for xp in ERROR_XPATHS_STRICT:
-            els = driver.find_elements(By.XPATH, xp)
-            if els:
-                for el in els:
-                    try:
-                        if el.is_displayed():
-                            return True
-                    except Exception:
-                        pass
-    except Exception:
-        pass
-    return False
-
+VIDEO_LIST_SELECTORS = [
+    '[data-e2e="music-item-list"] a[href*="/video/"]',
+    '[data-e2e="music-item-list"] a[href*="/photo/"]',
+    '[data-e2e="music-item-list"] div[class*="DivItemContainer"]',
+    'div[class*="DivVideoFeedV2"] a[href*="/video/"]',
+    'a[href*="/@"][href*="/video/"]',
+]
 
-def _check_video_list_exists(driver, timeout: float = 10.0) -> bool:
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        try:
-            selectors = [
-                '[data-e2e="music-item-list"] a[href*="/video/"]',
-                '[data-e2e="music-item-list"] a[href*="/photo/"]',
-                '[data-e2e="music-item-list"] div[class*="DivItemContainer"]',
-                'div[class*="DivVideoFeedV2"] a[href*="/video/"]',
-                'a[href*="/@"][href*="/video/"]',
-            ]
-            for sel in selectors:
-                els = driver.find_elements(By.CSS_SELECTOR, sel)
-                if els and len(els) > 0:
-                    logging.info(f'[動画リスト確認] セレクタ "{sel}" で {len(els)} 件発見')
-                    return True
-        except Exception as e:
-            logging.debug(f'動画リスト確認中の例外: {e}')
-        time.sleep(0.5)
-    return False
+CAPTCHA_SELECTORS = [
+    '#captcha-verify-image',
+    '#captcha_container',
+    'div[class*="captcha_verify"]',
+    'div[class*="CaptchaContainer"]',
+]
 
+# ページ内で状態を待ち、条件を満たすかタイムアウトしたら1回だけ結果を返す
+PAGE_PROBE_JS = """
+var want = arguments[0], timeoutMs = arguments[1], errXpaths = arguments[2],
+    listSels = arguments[3], captchaSels = arguments[4], goneXpaths = arguments[5],
+    done = arguments[arguments.length - 1];
+var t0 = Date.now();
+function visible(el) {
+  return !!(el && (el.offsetWidth || el.offsetHeight || el.getClientRects().length));
+}
+function anyVisible(xpath) {
+  var snap = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+  for (var j = 0; j < snap.snapshotLength; j++) {
+    if (visible(snap.snapshotItem(j))) return true;
+  }
+  return false;
+}
+function check() {
+  var r = {ready: document.readyState, body: !!document.body, error: false, gone: false, captcha: false,
+           video_list: 0, list_selector: '', rehydration: false};
+  for (var i = 0; i < errXpaths.length && !r.error; i++) {
+    r.error = anyVisible(errXpaths[i]);
+  }
+  for (var g = 0; r.error && g < goneXpaths.length && !r.gone; g++) {
+    r.gone = anyVisible(goneXpaths[g]);
+  }
+  for (var k = 0; k < captchaSels.length && !r.captcha; k++) {
+    r.captcha = visible(document.querySelector(captchaSels[k]));
+  }
+  if (want === 'video_list') {
+    for (var m = 0; m < listSels.length; m++) {
+      var n = document.querySelectorAll(listSels[m]).length;
+      if (n > 0) { r.video_list = n; r.list_selector = listSels[m]; break; }
+    }
+  }
+  var rh = document.getElementById('__UNIVERSAL_DATA_FOR_REHYDRATION__');
+  r.rehydration = !!(rh && rh.textContent && rh.textContent.length > 10);
+  return r;
+}
+function satisfied(r) {
+  if (r.error || r.captcha) return true;
+  var ready = (r.ready === 'interactive' || r.ready === 'complete') && r.body;
+  if (want === 'video_list') return r.video_list > 0;
+  if (want === 'video') return ready && r.rehydration;
+  return ready;
+}
+(function loop() {
+  var r;
+  try { r = check(); } catch (e) { r = {ready: '', error: false, gone: false, captcha: false, video_list: 0}; }
+  r.elapsed_ms = Date.now() - t0;
+  r.ok = satisfied(r) && !r.error && !r.captcha;
+  if (satisfied(r) || r.elapsed_ms >= timeoutMs) { r.timeout = !satisfied(r); done(r); return; }
+  setTimeout(loop, 100);
+})();
+"""
+
+
+def probe_page(driver, want: str = 'ready', timeout: float = 10.0) -> dict:
+    """
+    ページの状態を1回のスクリプト呼び出し（execute_async_script）で待つ。
+    want: 'ready'（DOM操作可能）/ 'video_list'（楽曲ページの動画一覧）/ 'video'（動画の埋め込みJSON）
+    エラーページかCAPTCHAが表示された時点でも待つのをやめて返す。
+    gone はエラーのうち投稿の削除・非公開を示す表示だったか。
 
-def _wait_for_page_load(driver, timeout: float = 10.0) -> bool:
-    t0 = time.time()
-    while time.time() - t0 < timeout:
+    戻り値: {'ok', 'ready', 'error', 'gone', 'captcha', 'video_list', 'list_selector', 'rehydration', 'timeout'}
+    """
+    deadline = time.time() + max(0.0, timeout)
+    res = None
+    while res is None:
+        remain_ms = int(max(0.0, deadline - time.time()) * 1000)
         try:
-            rs = driver.execute_script("return document.readyState")
-            if rs in ("interactive", "complete"):
-                body = driver.find_elements(By.TAG_NAME, "body")
-                if body:
-                    return True
-        except Exception:
-            pass
-        time.sleep(0.2)
-    return False
+            res = driver.execute_async_script(PAGE_PROBE_JS, want, remain_ms, ERROR_XPATHS_STRICT,
+                                              VIDEO_LIST_SELECTORS, CAPTCHA_SELECTORS, ERROR_XPATHS_GONE) or {}
+        except Exception as e:
+            # 遷移中はスクリプトが破棄されるので、期限まで少し待って再試行する
+            if time.time() >= deadline:
+                logging.debug(f'ページ状態確認の例外: {e}')
+                res = {}
+            else:
+                time.sleep(0.2)
+    for k, v in (('ok', False), ('error', False), ('gone', False), ('captcha', False), ('video_list', 0),
+                 ('rehydration', False), ('timeout', True)):
+        res.setdefault(k, v)
+    return res
 
 
 def resolve_final_url(driver, url: str, max_retry: int = 3, sleep_sec: float = 2.0) -> tuple[str, bool]:
@@ -790,9 +1322,11 @@ def resolve_final_url(driver, url: str, max_retry: int = 3, sleep_sec: float = 2
         
         wait_time = sleep_sec + i * 0.5
         time.sleep(wait_time)
-        _wait_for_page_load(driver, timeout=5.0)
+        st = probe_page(driver, 'video_list', timeout=10.0)
+        if st['captcha']:
+            logging.warning('[正規化] CAPTCHAが表示されています')
         
-        if _detect_error_page(driver):
+        if st['error']:
             logging.info(f"[正規化] エラーページ検知 → refresh (try {i + 1}/{max_retry})")
             
             extra_wait = int(CFG.get("ERROR_PAGE_EXTRA_WAIT_SEC", 10))
@@ -806,7 +1340,7 @@ def resolve_final_url(driver, url: str, max_retry: int = 3, sleep_sec: float = 2
             time.sleep(sleep_sec)
             continue
         
-        if _check_video_list_exists(driver, timeout=5.0):
+        if st['video_list']:
             logging.info('[正規化] 動画リスト確認OK → 正常なページと判断')
             try:
                 cur = driver.current_url or target
@@ -824,32 +1358,8 @@ def resolve_final_url(driver, url: str, max_retry: int = 3, sleep_sec: float = 2
 
 
 def wait_dom_interactive(driver, timeout: float = 3.0) -> bool:
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        try:
-            rs = driver.execute_script("return document.readyState")
-            if rs in ("interactive", "complete"):
-                return True
-        except Exception:
-            pass
-        time.sleep(0.1)
-    return False
-
-
-def wait_rehydration_json(driver, timeout: float = 4.0) -> bool:
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        try:
-            ok = driver.execute_script(
-                "var el=document.getElementById('__UNIVERSAL_DATA_FOR_REHYDRATION__');"
-                "return !!(el && el.innerText && el.innerText.length>10);"
-            )
-            if ok:
-                return True
-        except Exception:
-            pass
-        time.sleep(0.15)
-    return False
+    st = probe_page(driver, 'ready', timeout)
+    return st['ok'] or st['error']
 
 
 # === Excel I/O ==================================
@@ -890,15 +1400,51 @@ def create_excel_file(filename: str):
     sh.column_dimensions['C'].width = 18
     sh.column_dimensions['D'].width = 9
 
-    icon = wb.create_sheet(title='ユーザーアイコン')
-    icon.append(['アカウント名', 'アイコンパス'])
-    icon.column_dimensions['A'].width = 25
-    icon.column_dimensions['B'].width = 40
+    ensure_icon_sheet(wb)
 
     wb.save(filename)
     return wb
 
 
+def ensure_icon_sheet(workbook):
+    if 'ユーザーアイコン' not in workbook.sheetnames:
+        icon = workbook.create_sheet(title='ユーザーアイコン')
+        icon.append(['アカウント名', 'アイコンパス'])
+        icon.column_dimensions['A'].width = 25
+        icon.column_dimensions['B'].width = 40
+    return workbook['ユーザーアイコン']
+
+
+def read_icon_sheet(icon_sheet) -> dict[str, str]:
+    icons = {}
+    for r in icon_sheet.iter_rows(min_row=2, max_col=2):
+        if r[0].value and r[1].value:
+            icons[str(r[0].value)] = str(r[1].value)
+    return icons
+
+
+def update_icon_sheet(icon_sheet, account_icons: dict[str, str]) -> int:
+    """
+    ユーザーアイコンシートを差分更新する（既存行は書き換え、新規は追記）。
+
+    戻り値: 変更した行数
+    """
+    index = {}
+    for r in icon_sheet.iter_rows(min_row=2, max_col=2):
+        if r[0].value:
+            index[str(r[0].value)] = r
+    changed = 0
+    for acc, p in account_icons.items():
+        row = index.get(acc)
+        if row is None:
+            icon_sheet.append([acc, p])
+            changed += 1
+        elif row[1].value != p:
+            row[1].value = p
+            changed += 1
+    return changed
+
+
 def update_music_info_sheet(driver, workbook, song_name: str, song_url: str,
                             excel_filename: str, per_song_timeout: int = 300):
     sheet = workbook['楽曲情報']
@@ -1008,9 +1554,41 @@ def ensure_date_sheet_exists(workbook, date_str: str):
     return ws
 
 
-def get_video_urls(driver, max_items=None, timeout=10):
+def load_known_video_urls(workbook) -> dict[str, str]:
+    """
+    最新の日付シートから既知の投稿URLを読み込む。
+
+    戻り値: {投稿ID: URL}（シート上の順序を保持）
+    """
+    like_dates = sorted(s for s in workbook.sheetnames if re.fullmatch(r'\d{8}', s))
+    known: dict[str, str] = {}
+    if not like_dates:
+        return known
+    for row in workbook[like_dates[-1]].iter_rows(min_row=2, min_col=11, max_col=11):
+        url = row[0].value
+        if url:
+            known.setdefault(_video_id_from_url(str(url)), str(url))
+    return known
+
+
+def merge_incremental_urls(new_urls: list[str], known: dict[str, str], max_items=None) -> list[str]:
+    merged = list(new_urls)
+    got = {_video_id_from_url(u) for u in new_urls}
+    for pid, url in known.items():
+        if pid not in got:
+            merged.append(url)
+            got.add(pid)
+    if max_items:
+        merged = merged[:max_items]
+    return merged
+
+
+def get_video_urls(driver, max_items=None, timeout=10,
+                   known_ids: set[str] | None = None, stop_after_known: int = 0):
     video_urls: list[str] = []
     seen: set[str] = set()
+    consecutive_known = 0
+    early_stop = False
 
     try:
         driver.set_script_timeout(int(CFG.get("SCRIPT_TIMEOUT_SEC", 300)))
@@ -1087,6 +1665,17 @@ def get_video_urls(driver, max_items=None, timeout=10):
 
         new_urls = [u for u in all_urls if u and u not in seen]
 
+        if known_ids and stop_after_known > 0:
+            for i, u in enumerate(new_urls):
+                if _video_id_from_url(u) in known_ids:
+                    consecutive_known += 1
+                    if consecutive_known >= stop_after_known:
+                        new_urls = new_urls[:i + 1]
+                        early_stop = True
+                        break
+                else:
+                    consecutive_known = 0
+
         if new_urls:
             video_urls.extend(new_urls)
             for u in new_urls:
@@ -1103,6 +1692,10 @@ def get_video_urls(driver, max_items=None, timeout=10):
             else:
                 scroll_attempts = 0
 
+        if early_stop:
+            logging.info(f'既知の投稿が{stop_after_known}件連続したためスクロールを終了（差分収集）')
+            break
+
         if max_items and len(video_urls) >= max_items:
             break
 
@@ -1272,6 +1865,72 @@ def extract_video_stats_from_json(driver):
         }
 
 
+# 埋め込みJSONをページ内で解析し、必要な項目だけを返す（数百KBのJSON本体は転送しない）
+VIDEO_PROJECTION_JS = """
+var el = document.getElementById('__UNIVERSAL_DATA_FOR_REHYDRATION__');
+if (!el || !el.textContent) return null;
+var d;
+try { d = JSON.parse(el.textContent); } catch (e) { return null; }
+var scope = d.__DEFAULT_SCOPE__ || {};
+var item = ((scope['webapp.video-detail'] || {}).itemInfo || {}).itemStruct;
+if (!item) return null;
+var s = item.stats || {}, s2 = item.statsV2 || {}, a = item.author || {}, as = item.authorStats || {};
+function pick(k) { return (s[k] !== undefined && s[k] !== null) ? s[k] : (s2[k] !== undefined ? s2[k] : null); }
+return {
+  createTime: item.createTime || null,
+  stats: {diggCount: pick('diggCount'), commentCount: pick('commentCount'), shareCount: pick('shareCount'),
+          playCount: pick('playCount'), collectCount: pick('collectCount')},
+  author: {uniqueId: a.uniqueId || '', nickname: a.nickname || ''},
+  authorStats: {followerCount: as.followerCount || null},
+  avatar: a.avatarLarger || a.avatarMedium || a.avatarThumb || ''
+};
+"""
+
+
+def project_video_json(driver) -> dict | None:
+    """
+    動画ページの埋め込みJSONから投稿日時・統計・投稿者・アイコンURLだけを1回の呼び出しで取得する。
+
+    戻り値: 射影した辞書（JSONが無い・形式が違う場合は None）
+    """
+    try:
+        return driver.execute_script(VIDEO_PROJECTION_JS) or None
+    except Exception as e:
+        logging.info(f'JSON射影失敗（フォールバックへ）: {e}')
+        return None
+
+
+def _video_data_from_projection(proj: dict) -> dict:
+    stats = proj.get('stats') or {}
+    author = proj.get('author') or {}
+    author_stats = proj.get('authorStats') or {}
+
+    def as_int(v):
+        try:
+            return int(v or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    data = {
+        'いいね数': as_int(stats.get('diggCount')),
+        'コメント数': as_int(stats.get('commentCount')),
+        'シェア数': as_int(stats.get('shareCount')),
+        '再生回数': as_int(stats.get('playCount')),
+        '保存数': as_int(stats.get('collectCount')),
+        'フォロワー数': as_int(author_stats.get('followerCount')),
+        'アカウント名': author.get('uniqueId') or '',
+        'ニックネーム': author.get('nickname') or '',
+        'アバターURL': proj.get('avatar') or '',
+    }
+    try:
+        if proj.get('createTime'):
+            dt = datetime.fromtimestamp(int(proj['createTime']))
+            data['投稿日'] = f"{dt.year}/{dt.month:02d}/{dt.day:02d}"
+    except (TypeError, ValueError):
+        pass
+    return data
+
+
 def extract_text_with_retry(driver, by, value, description):
     try:
         element = WebDriverWait(driver, 5).until(EC.presence_of_element_located((by, value)))
@@ -1314,12 +1973,11 @@ def extract_avatar_url(driver, account_name):
         return ''
 
 
-def get_follower_count(driver, account_name, original_window, follower_window_handle):
+def _fetch_profile(driver, account_name):
     follower_count = ''
     nickname = ''
     try:
         account_url = f'https://www.tiktok.com/@{account_name}'
-        driver.switch_to.window(follower_window_handle)
         driver.get(account_url)
         wait_dom_interactive(driver, 2.5)
         nickname = extract_text_with_retry(
@@ -1329,57 +1987,154 @@ def get_follower_count(driver, account_name, original_window, follower_window_ha
             EC.presence_of_element_located((By.XPATH, '//strong[@data-e2e="followers-count"]'))
         )
         follower_count = parse_number(el.text)
-        driver.switch_to.window(original_window)
     except Exception as e:
-        logging.info(f'プロフィールからのフォロワー/ニックネーム取得失敗: {e}')
+        logging.info(f'プロフィールからのフォロワー/ニックネーム取得失敗: {account_name} | {e}')
     return follower_count or '', nickname or ''
 
 
-def write_video_data_to_row(sheet, row, data):
-    ordered_keys = [
-        '投稿ID', '投稿日', 'アカウント名', 'ニックネーム', 'いいね数', 'コメント数',
-        '保存数', 'シェア数', '再生回数', 'フォロワー数', '動画リンク(URL)', '更新日'
-    ]
-    for i, key in enumerate(ordered_keys):
-        row[i].value = data.get(key, '')
+def get_follower_count(driver, account_name, original_window, follower_window_handle):
+    try:
+        driver.switch_to.window(follower_window_handle)
+        return _fetch_profile(driver, account_name)
+    finally:
+        try:
+            driver.switch_to.window(original_window)
+        except Exception:
+            pass
 
 
-def extract_video_data(driver, original_window, follower_window_handle,
-                       follower_cache: dict[str, tuple] | None = None):
-    data: dict[str, object] = {}
-    try:
-        current_url = driver.current_url
-        post_id = _video_id_from_url(current_url)
-        data['投稿ID'] = post_id
+class ProfileLookupBatch:
+    """
+    フォロワー数/ニックネームが欠けている行をアカウント単位でまとめ、
+    曲の最後に1回の巡回で取得して行へ反映する。
+    動画ループ中はプロフィールページへ遷移しない。
+    """
 
-        raw_date = (extract_date(driver) or '').strip()
-        update_dt = datetime.now()
-        data['投稿日'] = parse_date_posted(raw_date, update_dt)
-        data['更新日'] = datetime.today().strftime('%Y/%m/%d %H:%M')
+    def __init__(self):
+        self._rows: dict[str, list] = {}
 
-        if '/video/' in current_url:
-            json_stats = extract_video_stats_from_json(driver)
-            data.update(json_stats)
+    def __len__(self):
+        return len(self._rows)
 
-            if not data.get('アカウント名'):
-                m = re.search(r'/@([^/]+)/', current_url)
-                if m:
-                    data['アカウント名'] = m.group(1)
+    @staticmethod
+    def needs_lookup(data: dict) -> bool:
+        return bool(data.get('アカウント名')) and (not data.get('ニックネーム') or not data.get('フォロワー数'))
 
-            account = (data.get('アカウント名') or '').strip()
-            need_profile = (not data.get('ニックネーム') or not data.get('フォロワー数'))
-            if need_profile and account:
-                if follower_cache is not None and account in follower_cache:
-                    fol, nick = follower_cache[account]
-                else:
-                    fol, nick = get_follower_count(driver, account, original_window, follower_window_handle)
-                    if follower_cache is not None:
-                        follower_cache[account] = (fol, nick)
-                if nick and not data.get('ニックネーム'):
-                    data['ニックネーム'] = nick
-                if fol and not data.get('フォロワー数'):
-                    data['フォロワー数'] = fol
-        else:
+    def add(self, account: str, row_idx: int, data: dict):
+        self._rows.setdefault(account, []).append((row_idx, data))
+
+    def resolve(self, driver, original_window, follower_window_handle,
+                follower_cache: dict[str, tuple] | None = None) -> dict[str, tuple]:
+        """
+        未取得アカウントのプロフィールをまとめて取得する。
+
+        戻り値: {アカウント名: (フォロワー数, ニックネーム)}
+        """
+        cache = follower_cache if follower_cache is not None else {}
+        pending = [a for a in self._rows if a not in cache]
+        if pending:
+            logging.info(f'[機能2] プロフィール一括取得: {len(pending)}件')
+            try:
+                driver.switch_to.window(follower_window_handle)
+                for account in pending:
+                    if is_stopped():
+                        break
+                    cache[account] = _fetch_profile(driver, account)
+            finally:
+                try:
+                    driver.switch_to.window(original_window)
+                except Exception:
+                    pass
+        return {a: cache[a] for a in self._rows if a in cache}
+
+    def patch(self, profiles: dict[str, tuple]) -> list[tuple[int, dict]]:
+        """
+        取得済みプロフィールで空欄のフォロワー数/ニックネームを埋める。
+
+        戻り値: 更新した (行番号, 行データ) のリスト
+        """
+        patched = []
+        for account, entries in self._rows.items():
+            fol, nick = profiles.get(account, ('', ''))
+            for row_idx, data in entries:
+                changed = False
+                if nick and data.get('ニックネーム') in (None, ''):
+                    data['ニックネーム'] = nick
+                    changed = True
+                if fol and data.get('フォロワー数') in (None, ''):
+                    data['フォロワー数'] = fol
+                    changed = True
+                if changed:
+                    patched.append((row_idx, data))
+        return patched
+
+
+VIDEO_ROW_KEYS = [
+    '投稿ID', '投稿日', 'アカウント名', 'ニックネーム', 'いいね数', 'コメント数',
+    '保存数', 'シェア数', '再生回数', 'フォロワー数', '動画リンク(URL)', '更新日'
+]
+
+
+def write_video_data_to_row(sheet, row, data):
+    for i, key in enumerate(VIDEO_ROW_KEYS):
+        row[i].value = data.get(key, '')
+
+
+def row_to_video_data(row) -> dict:
+    return {key: row[i].value for i, key in enumerate(VIDEO_ROW_KEYS)}
+
+
+def _lookup_profile(driver, account, original_window, follower_window_handle,
+                    follower_cache: dict[str, tuple] | None, defer: bool) -> tuple:
+    if follower_cache is not None and account in follower_cache:
+        return follower_cache[account]
+    if defer:
+        return '', ''
+    fol, nick = get_follower_count(driver, account, original_window, follower_window_handle)
+    if follower_cache is not None:
+        follower_cache[account] = (fol, nick)
+    return fol, nick
+
+
+def extract_video_data(driver, original_window, follower_window_handle,
+                       follower_cache: dict[str, tuple] | None = None,
+                       defer_profile: bool = False):
+    data: dict[str, object] = {}
+    try:
+        current_url = driver.current_url
+        post_id = _video_id_from_url(current_url)
+        data['投稿ID'] = post_id
+
+        with trace_stage('extract/project'):
+            proj = project_video_json(driver) if '/video/' in current_url else None
+        if proj:
+            data.update(_video_data_from_projection(proj))
+        if not data.get('投稿日'):
+            raw_date = (extract_date(driver) or '').strip()
+            data['投稿日'] = parse_date_posted(raw_date, datetime.now())
+        data['更新日'] = datetime.today().strftime('%Y/%m/%d %H:%M')
+
+        if '/video/' in current_url:
+            if not proj:
+                with trace_stage('extract/fallback'):
+                    data.update(extract_video_stats_from_json(driver))
+
+            if not data.get('アカウント名'):
+                m = re.search(r'/@([^/]+)/', current_url)
+                if m:
+                    data['アカウント名'] = m.group(1)
+
+            account = (data.get('アカウント名') or '').strip()
+            need_profile = (not data.get('ニックネーム') or not data.get('フォロワー数'))
+            if need_profile and account:
+                with trace_stage('extract/profile'):
+                    fol, nick = _lookup_profile(driver, account, original_window, follower_window_handle,
+                                                follower_cache, defer_profile)
+                if nick and not data.get('ニックネーム'):
+                    data['ニックネーム'] = nick
+                if fol and not data.get('フォロワー数'):
+                    data['フォロワー数'] = fol
+        else:
             m = re.search(r'/@([^/]+)/', current_url)
             data['アカウント名'] = m.group(1) if m else ''
             data['いいね数'] = extract_and_parse_number(driver, '//strong[@data-e2e="like-count"]', 'いいね数')
@@ -1391,18 +2146,16 @@ def extract_video_data(driver, original_window, follower_window_handle,
 
             account = data.get('アカウント名') or ''
             if account:
-                if follower_cache is not None and account in follower_cache:
-                    fol, nick = follower_cache[account]
-                else:
-                    fol, nick = get_follower_count(driver, account, original_window, follower_window_handle)
-                    if follower_cache is not None:
-                        follower_cache[account] = (fol, nick)
+                fol, nick = _lookup_profile(driver, account, original_window, follower_window_handle,
+                                            follower_cache, defer_profile)
                 data['フォロワー数'] = fol or ''
                 data['ニックネーム'] = nick or ''
 
         data['動画リンク(URL)'] = current_url
         account_for_avatar = data.get('アカウント名') or ''
-        data['アバターURL'] = extract_avatar_url(driver, account_for_avatar) if account_for_avatar else ''
+        if not data.get('アバターURL'):
+            with trace_stage('extract/avatar_url'):
+                data['アバターURL'] = extract_avatar_url(driver, account_for_avatar) if account_for_avatar else ''
 
     except Exception as e:
         logging.error(f'動画データ抽出エラー: {e}', exc_info=True)
@@ -1414,9 +2167,391 @@ def extract_video_data(driver, original_window, follower_window_handle,
     return data
 
 
+# === ユーザーアイコン取得（バックグラウンド） ======================
+AVATAR_MANIFEST_PATH = os.path.join(images_dir, '.avatar_manifest.json')
+# アイコン本体は内容のSHA-1をファイル名にして保存する（一度書いたら書き換えない）
+AVATAR_STORE_DIR = os.path.join(images_dir, 'icons')
+
+
+class AvatarDownloader:
+    """
+    ユーザーアイコンを別スレッドでダウンロードする。
+    アカウント単位・画像内容(SHA-1)単位で重複を排除し、既存ファイルは
+    ETag / Last-Modified による条件付きGETで再検証する。
+    同じ画像のアカウント同士は images/icons/<sha1>.jpg を共有する。ファイル名が内容で決まるので、
+    片方のアイコンが変わっても別ファイルになり、もう片方の表示は変わらない。
+    スクレイピング側は submit() するだけで、画像I/Oを待たない。
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 200, revalidate_hours: int = 24):
+        self._q = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._revalidate_sec = max(0, int(revalidate_hours)) * 3600
+        self._manifest = self._load_manifest()
+        self._inflight: set[str] = set()
+        self._completed: dict[str, str] = {}
+        self._threads = []
+        for i in range(max(1, int(workers))):
+            t = threading.Thread(target=self._run, name=f'avatar-dl-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @staticmethod
+    def _load_manifest() -> dict:
+        try:
+            if os.path.isfile(AVATAR_MANIFEST_PATH):
+                with open(AVATAR_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                    data = json.load(f) or {}
+                if isinstance(data, dict):
+                    return data
+        except Exception as e:
+            logging.info(f'アイコンマニフェスト読込失敗: {e}')
+        return {}
+
+    def _session(self):
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            import requests
+            s = requests.Session()
+            self._local.session = s
+        return s
+
+    @staticmethod
+    def _has_stored_file(ent: dict | None) -> bool:
+        # 旧形式（images/<アカウント>.jpg、他アカウントと共有され得る）は取り直して移行する
+        path = (ent or {}).get('path') or ''
+        return path.startswith('images/icons/') and os.path.exists(os.path.join(exec_dir, path))
+
+    def _is_fresh(self, ent: dict | None) -> bool:
+        if not self._has_stored_file(ent):
+            return False
+        return (time.time() - float(ent.get('checked') or 0)) < self._revalidate_sec
+
+    def submit(self, account: str, avatar_url: str) -> str | None:
+        """
+        ダウンロードを予約する。
+        既に新鮮なローカルファイルがある場合はキューに積まずにそのパスを返す。
+
+        戻り値: 現時点で使えるアイコンパス（無ければ None）
+        """
+        if not account or not avatar_url:
+            return None
+        with self._lock:
+            ent = self._manifest.get(account)
+            if account in self._completed:
+                return self._completed[account]
+            if self._is_fresh(ent):
+                self._completed[account] = ent['path']
+                return ent['path']
+            if account in self._inflight:
+                return None
+            try:
+                self._q.put_nowait((account, avatar_url))
+            except queue.Full:
+                logging.info(f'アイコンキューが満杯のため後回し: {account}')
+                return None
+            self._inflight.add(account)
+        return None
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            try:
+                if item is None:
+                    return
+                account, url = item
+                t0 = time.perf_counter()
+                try:
+                    self._fetch(account, url)
+                    if _trace is not None:
+                        _trace.event('avatar_download', time.perf_counter() - t0)
+                except Exception as e:
+                    logging.info(f'アイコン保存失敗: {account} | {e}')
+                finally:
+                    with self._lock:
+                        self._inflight.discard(account)
+            finally:
+                self._q.task_done()
+
+    def _fetch(self, account: str, url: str):
+        with self._lock:
+            ent = dict(self._manifest.get(account) or {})
+        headers = {}
+        has_file = self._has_stored_file(ent)
+        if has_file:
+            if ent.get('etag'):
+                headers['If-None-Match'] = ent['etag']
+            if ent.get('last_modified'):
+                headers['If-Modified-Since'] = ent['last_modified']
+
+        resp = self._session().get(url, headers=headers, timeout=(5, 15))
+        if resp.status_code == 304 and has_file:
+            ent['checked'] = time.time()
+            with self._lock:
+                self._manifest[account] = ent
+                self._completed[account] = ent['path']
+            return
+        if resp.status_code != 200:
+            logging.info(f'アイコン取得失敗: {account} | HTTP {resp.status_code}')
+            return
+
+        body = resp.content
+        sha1 = hashlib.sha1(body).hexdigest()
+        rel = f"images/icons/{sha1}.jpg"
+        icon_path = os.path.join(AVATAR_STORE_DIR, f'{sha1}.jpg')
+        if not os.path.exists(icon_path):
+            ensure_dir(AVATAR_STORE_DIR)
+            tmp = f'{icon_path}.{threading.get_ident()}.part'
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, icon_path)
+            logging.info(f'アイコン保存: {account} -> {rel}')
+
+        ent.update({
+            'path': rel, 'sha1': sha1, 'checked': time.time(),
+            'etag': resp.headers.get('ETag') or '',
+            'last_modified': resp.headers.get('Last-Modified') or '',
+        })
+        with self._lock:
+            self._manifest[account] = ent
+            self._completed[account] = rel
+
+    def completed(self, accounts=None) -> dict[str, str]:
+        with self._lock:
+            if accounts is None:
+                return dict(self._completed)
+            return {a: p for a, p in self._completed.items() if a in accounts}
+
+    def wait_idle(self, timeout: float = 30.0) -> bool:
+        t0 = time.time()
+        while self._q.unfinished_tasks:
+            if time.time() - t0 >= timeout:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def save_manifest(self):
+        try:
+            with self._lock:
+                mine = dict(self._manifest)
+            merged = self._load_manifest()
+            for acc, ent in mine.items():
+                cur = merged.get(acc)
+                if not cur or float(ent.get('checked') or 0) >= float(cur.get('checked') or 0):
+                    merged[acc] = ent
+            tmp = f'{AVATAR_MANIFEST_PATH}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, ensure_ascii=False)
+            os.replace(tmp, AVATAR_MANIFEST_PATH)
+        except Exception as e:
+            logging.info(f'アイコンマニフェスト保存失敗: {e}')
+
+    def close(self, timeout: float = 30.0):
+        if not self.wait_idle(timeout):
+            logging.info('アイコン取得の待機がタイムアウトしました（未完了分は次回取得）')
+        for _ in self._threads:
+            try:
+                self._q.put_nowait(None)
+            except queue.Full:
+                break
+        self.save_manifest()
+
+
 # === 【修正v3】機能1：URL収集 ==============================================
+LOGIN_COOKIE_NAMES = ('sessionid', 'sid_tt')
+_CHROME_EPOCH_OFFSET_SEC = 11644473600  # 1601-01-01 → 1970-01-01
+
+
+def check_login_cookies(user_data_dir: str, profile_dir: str = 'Default') -> bool | None:
+    """
+    ブラウザを起動せずに、プロファイルの Cookies データベースからログイン状態を判定する。
+    sessionid / sid_tt が存在し有効期限内なら True、存在しないか期限切れなら False。
+    ファイルが読めない・セッションCookieしか無いなど判断できない場合は None。
+    """
+    import sqlite3
+    from pathlib import Path
+    candidates = [os.path.join(user_data_dir, profile_dir, 'Network', 'Cookies'),
+                  os.path.join(user_data_dir, profile_dir, 'Cookies')]
+    db_path = next((c for c in candidates if os.path.isfile(c)), None)
+    if not db_path:
+        return None
+    placeholders = ','.join('?' for _ in LOGIN_COOKIE_NAMES)
+    query = (f"SELECT name, expires_utc, has_expires FROM cookies "
+             f"WHERE host_key LIKE '%tiktok.com' AND name IN ({placeholders})")
+    try:
+        # Chrome 起動中でも読めるよう読み取り専用・immutable で開く
+        uri = Path(os.path.abspath(db_path)).as_uri() + '?mode=ro&immutable=1'
+        con = sqlite3.connect(uri, uri=True, timeout=1)
+        try:
+            rows = con.execute(query, LOGIN_COOKIE_NAMES).fetchall()
+        finally:
+            con.close()
+    except Exception as e:
+        logging.info(f'[ログイン確認] Cookieデータベースを読めませんでした: {e}')
+        return None
+
+    if not rows:
+        return False
+    now = time.time() + 60
+    session_only = False
+    for name, expires_utc, has_expires in rows:
+        if not has_expires or not expires_utc:
+            session_only = True
+            continue
+        if int(expires_utc) / 1_000_000 - _CHROME_EPOCH_OFFSET_SEC > now:
+            return True
+    return None if session_only else False
+
+
+def _preflight_login_check(headless: bool, per_song_timeout: int, profiles: list[str] | None = None,
+                           chromedriver_path: str | None = None) -> bool:
+    """
+    機能1の開始前にログイン状態を確認する。
+    profiles を渡すとその分離プロファイルをそれぞれ確認する（渡さなければ共通プロファイル）。
+    Cookie で有効と判定できなかったプロファイルだけブラウザを起動して確認する。
+
+    戻り値: 処理を続行してよいかどうか
+    """
+    logging.info('[機能1] ログイン状態を確認します...')
+    targets = list(profiles) if profiles else [None]
+    if bool(CFG.get("OFFLINE_LOGIN_CHECK", True)):
+        unresolved = []
+        for prof in targets:
+            ud_dir = isolated_user_data_dir(prof) if prof else BASE_USER_DATA_ROOT
+            state = check_login_cookies(ud_dir)
+            if state:
+                continue
+            logging.info(f'[機能1] ログインCookie: {"無効/期限切れ" if state is False else "判定不可"}'
+                         f' @ {prof or "共通プロファイル"} → ブラウザで確認します')
+            unresolved.append(prof)
+        if not unresolved:
+            logging.info('[機能1] ログインCookieが有効なため、ブラウザでの確認を省略します')
+            return True
+        targets = unresolved
+    for prof in targets:
+        login_driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, for_function1=True,
+                                   profile_name=prof, chromedriver_path=chromedriver_path,
+                                   net_phase='login_check')
+        if not login_driver:
+            continue
+        try:
+            if not ensure_logged_in(login_driver, headless=headless):
+                logging.error(f'[機能1] ログインが確認できなかったため、処理を中断します @ {prof or "共通プロファイル"}')
+                return False
+            logging.info(f'[機能1] ログイン確認完了 @ {prof or "共通プロファイル"}')
+        finally:
+            safe_quit(login_driver)
+        # ログイン確認後、少し待機
+        time.sleep(2)
+    return True
+
+
+def _function1_song(driver, save_path, max_items, song_name, song_url,
+                    per_song_timeout: int = 300) -> tuple[int, bool]:
+    """
+    1曲分のURL収集を行い、曲ごとのブックへ保存する。
+
+    戻り値: (取得URL件数, 成功したかどうか)
+    """
+    sanitized = sanitize_filename(song_name)
+    excel_filename = os.path.join(save_path, f'{sanitized}.xlsx')
+
+    create_backup_if_exists(excel_filename)
+    if not os.path.exists(excel_filename):
+        wb = create_excel_file(excel_filename)
+    else:
+        wb = load_workbook(excel_filename)
+        ensure_icon_sheet(wb)
+
+    final_url, had_fatal_error = resolve_final_url(driver, song_url)
+    
+    update_music_info_sheet(driver, wb, song_name, final_url, excel_filename, per_song_timeout)
+
+    known_urls: dict[str, str] = {}
+    if bool(CFG.get("INCREMENTAL_COLLECT", False)):
+        known_urls = load_known_video_urls(wb)
+        if known_urls:
+            logging.info(f'[機能1] 差分収集: 既知の投稿 {len(known_urls)}件')
+
+    today_key = datetime.today().strftime('%Y%m%d')
+    date_sheet = create_or_clear_date_sheet(wb, today_key)
+
+    try:
+        driver.get(final_url)
+    except TimeoutException:
+        logging.warning(f'[機能1] ページ遷移タイムアウト: {song_name} → 続行')
+        try:
+            driver.execute_script("window.stop();")
+        except Exception:
+            pass
+
+    time.sleep(random.uniform(3, 5))
+
+    urls = []
+    skip_this_song = False
+
+    logging.info(f'[機能1] 動画リストの確認中: {song_name}')
+    st = probe_page(driver, 'video_list', timeout=25.0)
+    has_video_list = bool(st['video_list'])
+    if st['captcha']:
+        logging.warning(f'[機能1] CAPTCHAが表示されています: {song_name}')
+    
+    if not has_video_list:
+        if st['error']:
+            logging.warning(f'[機能1] エラーページ検知: {song_name} → リフレッシュ試行')
+            
+            extra_wait = int(CFG.get("ERROR_PAGE_EXTRA_WAIT_SEC", 10))
+            time.sleep(extra_wait)
+            
+            try:
+                driver.refresh()
+            except Exception:
+                pass
+            time.sleep(5.0)
+            
+            st = probe_page(driver, 'video_list', timeout=20.0)
+            has_video_list = bool(st['video_list'])
+            if not has_video_list:
+                if st['error']:
+                    logging.warning(f'[機能1] 楽曲ページがエラー表示のためURL収集をスキップします: {song_name}')
+                    skip_this_song = True
+                else:
+                    logging.warning(f'[機能1] 動画リストが見つかりませんが処理を続行します: {song_name}')
+        else:
+            logging.warning(f'[機能1] 動画リストが見つかりません（エラーページではない）: {song_name}')
+    
+    if has_video_list:
+        logging.info(f'[機能1] 動画リスト確認OK: {song_name}')
+    
+    if not skip_this_song:
+        urls = get_video_urls(driver, max_items=max_items, timeout=10, known_ids=set(known_urls),
+                              stop_after_known=int(CFG.get("INCREMENTAL_STOP_AFTER_KNOWN", 30)))
+        if known_urls:
+            harvested = len(urls)
+            urls = merge_incremental_urls(urls, known_urls, max_items)
+            logging.info(f'[機能1] 差分収集: 新規取得 {harvested}件 + 引き継ぎ → 合計 {len(urls)}件')
+        
+        if urls:
+            logging.info(f'[機能1] URL取得成功: {song_name} ({len(urls)}件)')
+        elif has_video_list:
+            logging.warning(f'[機能1] 動画リストはあるがURL取得結果が0件: {song_name}')
+        else:
+            logging.warning(f'[機能1] URL取得結果が0件: {song_name}')
+
+    if urls:
+        write_video_links(date_sheet, urls)
+    write_update_dates(date_sheet)
+
+    save_workbook_with_retry(wb, excel_filename, '（機能1）')
+
+    logging.info(f'[機能1] {song_name}: 取得URL件数={len(urls)}')
+    return len(urls), bool(urls)
+
+
 def function1(save_path, max_items, song_urls, headless=False,
-              per_song_timeout: int = 300, skip_on_timeout: bool = False):
+              per_song_timeout: int = 300, skip_on_timeout: bool = False,
+              profile_name: str | None = None, chromedriver_path: str | None = None):
     logging.info('#機能1 開始 (timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
 
     consecutive_errors = 0
@@ -1426,21 +2561,10 @@ def function1(save_path, max_items, song_urls, headless=False,
     long_wait_sec = int(CFG.get("LONG_WAIT_AFTER_ERRORS_SEC", 60))
 
     # 【追加】最初にログイン確認用のドライバを起動
-    check_login = bool(CFG.get("CHECK_LOGIN_BEFORE_START", True))
-    if check_login:
-        logging.info('[機能1] ログイン状態を確認します...')
-        login_driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, for_function1=True)
-        if login_driver:
-            try:
-                if not ensure_logged_in(login_driver, headless=headless):
-                    logging.error('[機能1] ログインが確認できなかったため、処理を中断します')
-                    safe_quit(login_driver)
-                    return
-                logging.info('[機能1] ログイン確認完了')
-            finally:
-                safe_quit(login_driver)
-            # ログイン確認後、少し待機
-            time.sleep(2)
+    if bool(CFG.get("CHECK_LOGIN_BEFORE_START", True)):
+        if not _preflight_login_check(headless, per_song_timeout, [profile_name] if profile_name else None,
+                                      chromedriver_path):
+            return
 
     for idx, (song_name, song_url) in enumerate(song_urls):
         if is_stopped():
@@ -1457,518 +2581,2040 @@ def function1(save_path, max_items, song_urls, headless=False,
             time.sleep(long_wait_sec)
             consecutive_errors = 0
 
-        driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, for_function1=True)
+        driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, for_function1=True,
+                             profile_name=profile_name, chromedriver_path=chromedriver_path)
         if not driver:
             logging.error('WebDriver初期化に失敗（機能1）')
             break
 
         try:
-            sanitized = sanitize_filename(song_name)
-            excel_filename = os.path.join(save_path, f'{sanitized}.xlsx')
+            _, ok = _function1_song(driver, save_path, max_items, song_name, song_url, per_song_timeout)
+            consecutive_errors = 0 if ok else consecutive_errors + 1
+        except TimeoutException as te:
+            logging.warning(f'[機能1] タイムアウト: {song_name} | {te}')
+            consecutive_errors += 1
+            if not skip_on_timeout:
+                raise
+        except Exception as e:
+            logging.error(f'[機能1] 例外: {song_name} | {e}', exc_info=True)
+            consecutive_errors += 1
+            if not skip_on_timeout:
+                raise
+        finally:
+            safe_quit(driver)
 
-            create_backup_if_exists(excel_filename)
-            if not os.path.exists(excel_filename):
-                wb = create_excel_file(excel_filename)
-            else:
-                wb = load_workbook(excel_filename)
-                if 'ユーザーアイコン' not in wb.sheetnames:
-                    icon = wb.create_sheet(title='ユーザーアイコン')
-                    icon.append(['アカウント名', 'アイコンパス'])
-                    icon.column_dimensions['A'].width = 25
-                    icon.column_dimensions['B'].width = 40
-
-            final_url, had_fatal_error = resolve_final_url(driver, song_url)
-            
-            update_music_info_sheet(driver, wb, song_name, final_url, excel_filename, per_song_timeout)
+    log_net_stats('機能1')
+    logging.info('#機能1 終了')
+
+
+# === 機能2 =====================================
+JOURNAL_DIR = os.path.join(exec_dir, 'journals')
+TRACE_DIR = os.path.join(exec_dir, 'traces')
 
-            today_key = datetime.today().strftime('%Y%m%d')
-            date_sheet = create_or_clear_date_sheet(wb, today_key)
 
+class StageTrace:
+    """
+    機能2の工程別所要時間トレース（JSONL、1プロセス1ファイル）。
+    行ごとに工程→秒を1レコードで書き、曲単位の工程やアイコンDLは別レコードで書く。
+    run_id が同じファイルを trace_report でまとめて集計する。
+    """
+
+    def __init__(self, run_id: str, profile: str | None):
+        self.run_id = run_id
+        self.profile = profile or 'main'
+        name = f'f2_{run_id}_{sanitize_filename(self.profile)}_{os.getpid()}.jsonl'
+        self.path = os.path.join(TRACE_DIR, name)
+        self._lock = threading.Lock()
+        self._fh = None
+        self.row: dict[str, float] | None = None
+
+    def _write(self, rec: dict):
+        rec['profile'] = self.profile
+        rec['ts'] = round(time.time(), 3)
+        line = json.dumps(rec, ensure_ascii=False) + '\n'
+        with self._lock:
             try:
-                driver.get(final_url)
-            except TimeoutException:
-                logging.warning(f'[機能1] ページ遷移タイムアウト: {song_name} → 続行')
+                if self._fh is None:
+                    ensure_dir(TRACE_DIR)
+                    self._fh = open(self.path, 'a', encoding='utf-8')
+                self._fh.write(line)
+            except OSError as e:
+                logging.info(f'トレース書き込み失敗: {e}')
+
+    def begin_row(self):
+        self.row = {}
+
+    def end_row(self, song: str, row_idx: int, outcome: str, total_sec: float):
+        stages = {k: round(v, 3) for k, v in (self.row or {}).items()}
+        self.row = None
+        self._write({'kind': 'row', 'song': song, 'row': row_idx, 'outcome': outcome,
+                     'total': round(total_sec, 3), 'stages': stages})
+
+    def add(self, stage: str, sec: float):
+        if self.row is not None:
+            self.row[stage] = self.row.get(stage, 0.0) + sec
+
+    def song(self, song: str, stages: dict[str, float]):
+        self._write({'kind': 'song', 'song': song, 'stages': {k: round(v, 3) for k, v in stages.items()}})
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+
+    def event(self, stage: str, sec: float):
+        self._write({'kind': 'event', 'stage': stage, 'sec': round(sec, 3)})
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
                 try:
-                    driver.execute_script("window.stop();")
+                    self._fh.close()
                 except Exception:
                     pass
+                self._fh = None
 
-            time.sleep(random.uniform(3, 5))
-            _wait_for_page_load(driver, timeout=10.0)
 
-            urls = []
-            skip_this_song = False
+_trace: StageTrace | None = None
 
-            logging.info(f'[機能1] 動画リストの確認中: {song_name}')
-            has_video_list = _check_video_list_exists(driver, timeout=15.0)
-            
-            if not has_video_list:
-                if _detect_error_page(driver):
-                    logging.warning(f'[機能1] エラーページ検知: {song_name} → リフレッシュ試行')
-                    
-                    extra_wait = int(CFG.get("ERROR_PAGE_EXTRA_WAIT_SEC", 10))
-                    time.sleep(extra_wait)
-                    
+
+def start_trace(run_id: str | None, profile: str | None):
+    global _trace
+    if _trace is not None:
+        _trace.close()
+    _trace = StageTrace(run_id, profile) if run_id and bool(CFG.get("TRACE_ENABLED", True)) else None
+
+
+def stop_trace():
+    global _trace
+    if _trace is not None:
+        _trace.close()
+    _trace = None
+
+
+@contextmanager
+def trace_stage(stage: str):
+    """処理中の行に工程の所要時間を加算する（トレース無効・行外なら何もしない）。"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _trace is not None:
+            _trace.add(stage, time.perf_counter() - t0)
+
+
+def new_trace_run_id() -> str:
+    """古いトレースを消してから、今回の実行IDを返す。"""
+    keep_sec = int(CFG.get("TRACE_KEEP_DAYS", 14)) * 86400
+    try:
+        for name in os.listdir(TRACE_DIR):
+            path = os.path.join(TRACE_DIR, name)
+            if time.time() - os.path.getmtime(path) > keep_sec:
+                os.remove(path)
+    except OSError:
+        pass
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+def _percentile(sorted_vals: list[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    # nearest-rank 法
+    k = max(0, min(len(sorted_vals) - 1, int(-(-pct * len(sorted_vals) // 100)) - 1))
+    return sorted_vals[k]
+
+
+def _dist(vals: list[float]) -> str:
+    vals = sorted(vals)
+    return (f'n={len(vals)} p50={_percentile(vals, 50):.2f} p90={_percentile(vals, 90):.2f} '
+            f'p99={_percentile(vals, 99):.2f} max={vals[-1]:.2f} 計={sum(vals):.0f}s')
+
+
+def trace_report(run_id: str) -> list[str]:
+    """
+    実行IDのトレースを集計し、工程別・曲別・プロファイル別の分位点を
+    traces/f2_<run_id>_report.txt に書き出す。
+
+    戻り値: レポートの行（トレースが無ければ空）
+    """
+    stages: dict[str, list[float]] = {}
+    songs: dict[str, list[float]] = {}
+    profiles: dict[str, list[float]] = {}
+    outcomes: dict[str, int] = {}
+    prefix = f'f2_{run_id}_'
+    try:
+        names = sorted(n for n in os.listdir(TRACE_DIR) if n.startswith(prefix) and n.endswith('.jsonl'))
+    except OSError:
+        return []
+    for name in names:
+        with open(os.path.join(TRACE_DIR, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                kind = rec.get('kind')
+                if kind == 'event':
+                    stages.setdefault(rec['stage'], []).append(rec['sec'])
+                    continue
+                for k, v in (rec.get('stages') or {}).items():
+                    key = k if kind == 'row' else f'曲:{k}'
+                    stages.setdefault(key, []).append(v)
+                if kind == 'row':
+                    songs.setdefault(rec.get('song', ''), []).append(rec['total'])
+                    profiles.setdefault(rec.get('profile', ''), []).append(rec['total'])
+                    outcomes[rec.get('outcome', '')] = outcomes.get(rec.get('outcome', ''), 0) + 1
+    if not songs and not stages:
+        return []
+
+    all_rows = [v for vals in songs.values() for v in vals]
+    lines = [f'機能2トレース {run_id}']
+    if all_rows:
+        lines.append(f'行全体: {_dist(all_rows)} 結果: {_format_counts(outcomes)}')
+    lines.append('[工程別]')
+    for k in sorted(stages, key=lambda k: -sum(stages[k])):
+        lines.append(f'  {k}: {_dist(stages[k])}')
+    lines.append('[曲別（行の所要）]')
+    for k in sorted(songs, key=lambda k: -sum(songs[k])):
+        lines.append(f'  {k}: {_dist(songs[k])}')
+    lines.append('[プロファイル別（行の所要）]')
+    for k in sorted(profiles):
+        lines.append(f'  {k}: {_dist(profiles[k])}')
+
+    try:
+        with open(os.path.join(TRACE_DIR, f'f2_{run_id}_report.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    except OSError as e:
+        logging.info(f'トレースレポートの保存に失敗: {e}')
+    return lines
+
+
+def log_trace_report(run_id: str | None):
+    if not run_id:
+        return
+    try:
+        lines = trace_report(run_id)
+    except Exception as e:
+        logging.info(f'トレースレポート作成に失敗: {e}')
+        return
+    for line in lines:
+        logging.info(f'[トレース] {line}')
+
+
+class RowJournal:
+    """
+    曲ごとの取得結果ジャーナル（JSONL）。
+    1行取得するたびに追記し、ブックの保存に成功したら破棄する。
+    再実行時は load() した行を再取得せずにブックへ反映する。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.icons: dict[str, str] = {}
+        self._fh = None
+
+    @classmethod
+    def for_song(cls, song_name: str, date_str: str, suffix: str = ''):
+        name = f'{sanitize_filename(song_name)}_{date_str}{suffix}.jsonl'
+        return cls(os.path.join(JOURNAL_DIR, name))
+
+    def load(self) -> dict[str, dict]:
+        records: dict[str, dict] = {}
+        if not os.path.isfile(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    # 書き込み途中で落ちた最終行は捨てる
+                    continue
+                url = rec.get('url')
+                if url:
+                    records.setdefault(url, {}).update(rec.get('data') or {})
+                if rec.get('icons'):
+                    self.icons.update(rec['icons'])
+        return records
+
+    def append(self, url: str, data: dict):
+        self._write({'url': url, 'data': data})
+
+    def append_icons(self, icons: dict[str, str]):
+        if icons:
+            self._write({'icons': icons})
+
+    def _write(self, rec: dict):
+        if self._fh is None:
+            ensure_dir(os.path.dirname(self.path))
+            needs_newline = False
+            if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b'\n'
+            self._fh = open(self.path, 'a', encoding='utf-8')
+            if needs_newline:
+                self._fh.write('\n')
+        self._fh.write(json.dumps(rec, ensure_ascii=False, default=str) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def discard(self):
+        self.close()
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except Exception as e:
+            logging.info(f'ジャーナル削除失敗: {self.path} | {e}')
+
+
+DEAD_POSTS_PATH = os.path.join(exec_dir, 'dead_posts.jsonl')
+
+
+class DeadPostCache:
+    """
+    削除・非公開などで開けなかった投稿の記録（追記のみのJSONL、投稿IDごと）。
+    削除・非公開の表示（ERROR_XPATHS_GONE）が DEAD_POST_THRESHOLD 回続いた投稿は取得をスキップし、
+    最後の失敗から DEAD_POST_REPROBE_DAYS 経過したら1回だけ開き直して確認する。
+    開けた時点で失敗回数は0に戻る。複数ワーカーが同じファイルに追記してよい。
+    """
+
+    def __init__(self, path: str = DEAD_POSTS_PATH):
+        self.path = path
+        self.threshold = int(CFG.get("DEAD_POST_THRESHOLD", 3))
+        self.reprobe_sec = float(CFG.get("DEAD_POST_REPROBE_DAYS", 7)) * 86400
+        self.enabled = bool(CFG.get("DEAD_POST_CACHE_ENABLED", True)) and self.threshold > 0
+        # 投稿ID -> (連続失敗回数, 最後の失敗時刻)
+        self.entries: dict[str, tuple[int, float]] = {}
+        self.lines = 0
+        if self.enabled:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
                     try:
-                        driver.refresh()
-                    except Exception:
-                        pass
-                    time.sleep(5.0)
-                    _wait_for_page_load(driver, timeout=10.0)
-                    
-                    has_video_list = _check_video_list_exists(driver, timeout=10.0)
-                    if not has_video_list:
-                        if _detect_error_page(driver):
-                            logging.warning(f'[機能1] 楽曲ページがエラー表示のためURL収集をスキップします: {song_name}')
-                            skip_this_song = True
-                            consecutive_errors += 1
-                        else:
-                            logging.warning(f'[機能1] 動画リストが見つかりませんが処理を続行します: {song_name}')
-                else:
-                    logging.warning(f'[機能1] 動画リストが見つかりません（エラーページではない）: {song_name}')
-            
-            if has_video_list:
-                logging.info(f'[機能1] 動画リスト確認OK: {song_name}')
-            
-            if not skip_this_song:
-                urls = get_video_urls(driver, max_items=max_items, timeout=10)
-                
-                if urls:
-                    consecutive_errors = 0
-                    logging.info(f'[機能1] URL取得成功: {song_name} ({len(urls)}件)')
-                else:
-                    if has_video_list:
-                        consecutive_errors += 1
-                        logging.warning(f'[機能1] 動画リストはあるがURL取得結果が0件: {song_name}')
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.lines += 1
+                    pid = rec.get('id')
+                    if not pid:
+                        continue
+                    if rec.get('ok'):
+                        self.entries.pop(pid, None)
                     else:
-                        consecutive_errors += 1
-                        logging.warning(f'[機能1] URL取得結果が0件: {song_name}')
+                        fails, _ = self.entries.get(pid, (0, 0.0))
+                        self.entries[pid] = (fails + 1, float(rec.get('ts') or 0))
+        except OSError:
+            pass
 
-            if urls:
-                write_video_links(date_sheet, urls)
-            write_update_dates(date_sheet)
+    def _append(self, rec: dict):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logging.info(f'失効投稿リストの書き込み失敗: {e}')
+
+    def should_skip(self, post_id: str) -> bool:
+        """戻り値: 失敗が続いていて、まだ再確認の時期でないか"""
+        if not self.enabled or not post_id:
+            return False
+        fails, last = self.entries.get(post_id, (0, 0.0))
+        return fails >= self.threshold and time.time() - last < self.reprobe_sec
 
-            while True:
-                try:
-                    wb.save(excel_filename)
+    def record_failure(self, post_id: str, reason: str):
+        if not self.enabled or not post_id:
+            return
+        fails, _ = self.entries.get(post_id, (0, 0.0))
+        now = time.time()
+        self.entries[post_id] = (fails + 1, now)
+        self._append({'id': post_id, 'ok': False, 'reason': reason, 'ts': round(now)})
+
+    def record_ok(self, post_id: str):
+        # 失敗歴のある投稿だけ書く（ファイルを小さく保つ）
+        if not self.enabled or not post_id or post_id not in self.entries:
+            return
+        del self.entries[post_id]
+        self._append({'id': post_id, 'ok': True, 'ts': round(time.time())})
+
+    def compact(self):
+        """
+        まだ失敗歴のある投稿だけを残してファイルを書き直す。
+        ワーカーが追記していない時（実行開始前）に呼ぶこと。
+        """
+        if not self.enabled or self.lines <= max(1000, 2 * sum(f for f, _ in self.entries.values())):
+            return
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for pid, (fails, last) in self.entries.items():
+                    rec = json.dumps({'id': pid, 'ok': False, 'reason': 'compacted', 'ts': round(last)})
+                    f.write((rec + '\n') * fails)
+            os.replace(tmp, self.path)
+            logging.info(f'失効投稿リストを整理: {self.lines}行 → {sum(f for f, _ in self.entries.values())}行')
+        except OSError as e:
+            logging.info(f'失効投稿リストの整理に失敗: {e}')
+
+
+def _as_datetime(value, fmts=('%Y/%m/%d %H:%M', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')):
+    if isinstance(value, datetime):
+        return value
+    s = str(value or '').strip()
+    for fmt in fmts:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+class RefreshPlanner:
+    """
+    同じ曲の過去の日付シートを参照して、投稿ごとに今日再取得するかを決める。
+
+    - 投稿日・アカウント名・ニックネームは不変項目として前回値を引き継ぐ
+    - 新しい投稿（REFRESH_RECENT_DAYS 以内）と伸びている投稿は毎日取得
+    - それ以外は最後の取得から REFRESH_SLOW_INTERVAL_DAYS 経過したら取得し、
+      それまでは前回の行をそのまま引き継ぐ（更新日は前回取得時のまま）
+    """
+    IMMUTABLE_KEYS = ('投稿日', 'アカウント名', 'ニックネーム')
+    STAT_KEYS = ('いいね数', 'コメント数', '保存数', 'シェア数', '再生回数')
+
+    def __init__(self, workbook, date_str: str, now: datetime | None = None):
+        self.now = now or datetime.now()
+        self.recent_days = int(CFG.get("REFRESH_RECENT_DAYS", 14))
+        self.slow_interval_days = int(CFG.get("REFRESH_SLOW_INTERVAL_DAYS", 7))
+        self.fast_growth_rate = float(CFG.get("REFRESH_FAST_GROWTH_RATE", 0.05))
+        max_sheets = max(1, int(CFG.get("REFRESH_HISTORY_SHEETS", 7)))
+        prev = sorted((n for n in workbook.sheetnames if re.fullmatch(r'\d{8}', n) and n < date_str),
+                      reverse=True)[:max_sheets]
+        # 投稿ID -> 取得済みスナップショット（新しい順）
+        self.history: dict[str, list[dict]] = {}
+        for name in prev:
+            for row in workbook[name].iter_rows(min_row=2, max_col=12):
+                snap = row_to_video_data(row)
+                link = snap.get('動画リンク(URL)')
+                if not link:
+                    continue
+                pid = str(snap.get('投稿ID') or _video_id_from_url(str(link)))
+                self.history.setdefault(pid, []).append(snap)
+
+    @staticmethod
+    def _is_complete(snap: dict) -> bool:
+        return all(snap.get(k) not in (None, '') for k in VIDEO_ROW_KEYS)
+
+    def _fetched_snapshots(self, pid: str) -> list[dict]:
+        # 引き継ぎ行は前回と同じ更新日を持つため、更新日で重複を除く
+        out, seen = [], set()
+        for snap in self.history.get(pid, []):
+            if not self._is_complete(snap):
+                continue
+            ts = _as_datetime(snap.get('更新日'))
+            if ts is None or ts in seen:
+                continue
+            seen.add(ts)
+            out.append(dict(snap, _fetched_at=ts))
+        return out
+
+    def _growth_rate(self, snaps: list[dict]) -> float:
+        if len(snaps) < 2:
+            return 0.0
+        new, old = snaps[0], snaps[1]
+        try:
+            v_new = float(new.get('再生回数') or 0)
+            v_old = float(old.get('再生回数') or 0)
+        except (TypeError, ValueError):
+            return 0.0
+        days = (new['_fetched_at'] - old['_fetched_at']).total_seconds() / 86400
+        if v_old <= 0 or days <= 0:
+            return 0.0
+        return (v_new - v_old) / v_old / days
+
+    def carry_forward(self, link: str) -> dict | None:
+        """
+        今日は再取得しない投稿なら、引き継ぐ行データを返す（再取得する場合は None）。
+        """
+        pid = _video_id_from_url(str(link))
+        snaps = self._fetched_snapshots(pid)
+        if not snaps:
+            return None
+        last = snaps[0]
+        posted = _as_datetime(last.get('投稿日'))
+        if posted is None or (self.now - posted).days <= self.recent_days:
+            return None
+        if (self.now - last['_fetched_at']).days >= self.slow_interval_days:
+            return None
+        if self._growth_rate(snaps) >= self.fast_growth_rate:
+            return None
+        carried = {k: last.get(k) for k in VIDEO_ROW_KEYS}
+        carried['動画リンク(URL)'] = link
+        return carried
+
+    def fill_immutable(self, link: str, data: dict):
+        """取得結果で空の不変項目を過去の値で補う。"""
+        pid = _video_id_from_url(str(link))
+        for snap in self.history.get(pid, []):
+            for k in self.IMMUTABLE_KEYS:
+                if data.get(k) in (None, '') and snap.get(k) not in (None, ''):
+                    data[k] = snap[k]
+
+
+def save_workbook_with_retry(wb, excel_filename: str, label: str = '') -> bool:
+    """
+    ブックを保存する。ファイルが開かれている等で失敗した場合は
+    ダイアログで止めずに一定間隔で再試行する。
+
+    戻り値: 保存できたかどうか
+    """
+    retries = max(1, int(CFG.get("SAVE_RETRY_COUNT", 12)))
+    interval = max(0, int(CFG.get("SAVE_RETRY_INTERVAL_SEC", 5)))
+    for i in range(retries):
+        try:
+            wb.save(excel_filename)
+            return True
+        except PermissionError:
+            logging.warning(f'ファイルが開かれているため保存できません{label}: {excel_filename} '
+                            f'({i + 1}/{retries}, {interval}秒後に再試行)')
+        except Exception as e:
+            logging.error(f'保存中エラー{label}: {e}')
+            return False
+        if is_stopped():
+            break
+        time.sleep(interval)
+    logging.error(f'保存を断念しました{label}: {excel_filename}')
+    return False
+
+
+class TabPrefetcher:
+    """
+    同じドライバの複数タブで次の動画ページを先に読み込ませておく。
+    i 件目を抽出している間に i+1 〜 i+tabs-1 件目が別タブで読み込まれる。
+    tabs=1 のときは従来どおり1タブで順番に遷移する。
+    """
+
+    def __init__(self, driver, main_handle, tabs: int = 1):
+        self.driver = driver
+        self.handles = [main_handle]
+        self.last_load_sec = 0.0
+        for _ in range(max(1, tabs) - 1):
+            try:
+                before = set(driver.window_handles)
+                driver.execute_script("window.open('');")
+                new = [h for h in driver.window_handles if h not in before]
+                if not new:
                     break
-                except PermissionError:
+                self.handles.append(new[0])
+                driver.switch_to.window(new[0])
+                apply_net_policy(driver, 'video_detail')
+            except Exception as e:
+                logging.info(f'[機能2] 先読みタブを開けませんでした: {e}')
+                break
+        try:
+            driver.switch_to.window(main_handle)
+        except Exception:
+            pass
+        if len(self.handles) > 1:
+            logging.info(f'[機能2] 先読みタブ: {len(self.handles)}')
+
+    def _load(self, handle, link) -> bool:
+        """
+        戻り値: 読み込み開始がタイムアウトしなかったか
+        """
+        self.driver.switch_to.window(handle)
+        try:
+            self.driver.get(link)
+            return True
+        except TimeoutException:
+            try:
+                self.driver.execute_script("window.stop();")
+            except Exception:
+                pass
+            return False
+
+    def iterate(self, items: list[tuple[int, str]]):
+        """
+        (行番号, URL) を順に読み込み、そのページのタブに切り替えた状態で
+        (行番号, URL, タブ, 読み込みタイムアウトしたか) を返す。
+        """
+        n = len(self.handles)
+        timed_out: dict[int, bool] = {}
+        load_sec: dict[int, float] = {}
+
+        def load(i, handle):
+            t0 = time.perf_counter()
+            timed_out[i] = not self._load(handle, items[i][1])
+            load_sec[i] = time.perf_counter() - t0
+
+        for i in range(min(n, len(items))):
+            load(i, self.handles[i])
+        for i, (row_idx, link) in enumerate(items):
+            handle = self.handles[i % n]
+            self.driver.switch_to.window(handle)
+            # 読み込み開始（driver.get）にかかった時間。トレース用
+            self.last_load_sec = load_sec.pop(i, 0.0)
+            yield row_idx, link, handle, timed_out.pop(i, False)
+            if i + n < len(items):
+                load(i + n, handle)
+
+
+class Function2Session:
+    """
+    機能2のブラウザ一式（ドライバ・フォロワー用ウィンドウ・アイコン取得スレッド）。
+    複数の曲（または行範囲）を同じセッションで処理する。
+    """
+
+    def __init__(self, headless=False, per_song_timeout: int = 300,
+                 profile_name: str | None = None, chromedriver_path: str | None = None):
+        ensure_dir(images_dir)
+        self.driver = init_driver(headless=headless, per_song_timeout=per_song_timeout,
+                                  profile_name=profile_name, chromedriver_path=chromedriver_path)
+        self.profile_name = profile_name
+        if not self.driver:
+            logging.error('WebDriver初期化に失敗（機能2）')
+            raise DriverInitFatalError('WebDriver初期化に失敗（機能2）')
+
+        self.avatars = AvatarDownloader(
+            workers=int(CFG.get("AVATAR_DOWNLOAD_WORKERS", 2)),
+            queue_size=int(CFG.get("AVATAR_QUEUE_SIZE", 200)),
+            revalidate_hours=int(CFG.get("AVATAR_REVALIDATE_HOURS", 24)),
+        )
+        self.original_window = None
+        try:
+            self.original_window = self.driver.current_window_handle
+            self.driver.execute_script("window.open('');")
+            self.follower_window_handle = self.driver.window_handles[-1]
+            self.driver.switch_to.window(self.follower_window_handle)
+            apply_net_policy(self.driver, 'video_detail')
+            self.driver.switch_to.window(self.original_window)
+        except Exception:
+            self.follower_window_handle = self.driver.current_window_handle
+
+        self.prefetcher = TabPrefetcher(self.driver, self.original_window, int(CFG.get("PREFETCH_TABS", 1)))
+        self.follower_cache: dict[str, tuple] = {}
+        self.dead_posts = DeadPostCache()
+        self.defer_profile = bool(CFG.get("DEFER_PROFILE_LOOKUPS", True))
+        self.use_refresh_policy = bool(CFG.get("REFRESH_POLICY_ENABLED", True))
+
+    def close(self):
+        self.avatars.close(float(CFG.get("AVATAR_FLUSH_TIMEOUT_SEC", 30)))
+        safe_quit(self.driver)
+        log_net_stats('機能2')
+        if self.profile_name:
+            snapshot_warm_cache(isolated_user_data_dir(self.profile_name))
+
+
+def _is_row_filled(row) -> bool:
+    return all(cell.value not in (None, '') for cell in row[:10]) and bool(row[10].value) and bool(row[11].value)
+
+
+def _is_data_filled(data: dict) -> bool:
+    return all(data.get(k) not in (None, '') for k in VIDEO_ROW_KEYS[:10]) \
+        and bool(data.get('動画リンク(URL)')) and bool(data.get('更新日'))
+
+
+class WorkbookWriter:
+    """
+    機能2のブック書き込み専用スレッド。ブラウザ側は put_row / put_icons で結果を渡すだけで、
+    行への反映・ユーザーアイコンシートの更新・保存（ロック時の再試行）はこのスレッドが行う。
+    開始後、ブラウザ側のスレッドはブックに触れないこと。
+    """
+
+    def __init__(self, wb, sheet, excel_filename: str, queue_size: int = 500):
+        self.wb = wb
+        self.sheet = sheet
+        self.excel_filename = excel_filename
+        self.saved = False
+        self.save_sec = 0.0
+        self._q: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put_row(self, row_idx: int, data: dict):
+        # キューが満杯ならブラウザ側を待たせる（メモリを使い切らないための背圧）
+        self._q.put(('row', row_idx, dict(data)))
+
+    def put_icons(self, account_icons: dict[str, str]):
+        self._q.put(('icons', dict(account_icons)))
+
+    def close(self, save: bool = True) -> bool:
+        """
+        キューを書き切ってから保存する。
+
+        戻り値: 保存に成功したか（save=False のときは False）
+        """
+        self._q.put(('close', save))
+        self._thread.join()
+        return self.saved
+
+    def _run(self):
+        while True:
+            op = self._q.get()
+            try:
+                if op[0] == 'row':
+                    _, row_idx, data = op
+                    row = tuple(self.sheet.cell(row=row_idx, column=c) for c in range(1, len(VIDEO_ROW_KEYS) + 1))
+                    write_video_data_to_row(self.sheet, row, data)
+                elif op[0] == 'icons':
+                    update_icon_sheet(ensure_icon_sheet(self.wb), op[1])
+                elif op[0] == 'close':
+                    if op[1]:
+                        t0 = time.perf_counter()
+                        self.saved = save_workbook_with_retry(self.wb, self.excel_filename, '（機能2）')
+                        self.save_sec = time.perf_counter() - t0
+                    return
+            except Exception as e:
+                logging.error(f'[機能2] ブック書き込みで例外: {e}')
+
+
+def _function2_song(sess: Function2Session, save_path, song_name: str, date_str: str,
+                    row_range: tuple[int, int] | None = None) -> dict | None:
+    """
+    1曲分（row_range 指定時はその行範囲のみ）の明細を取得する。
+    ブックへの反映と保存は WorkbookWriter のスレッドに任せ、このスレッドはブラウザ操作だけを行う。
+    行範囲指定時はブックを保存せず、結果を範囲ごとのジャーナルにだけ残す
+    （merge_song_journals でまとめて反映する）。
+
+    戻り値: 件数の要約（ファイルが無い場合は None）
+    """
+    driver = sess.driver
+    avatars = sess.avatars
+    sanitized = sanitize_filename(song_name)
+    excel_filename = os.path.join(save_path, f'{sanitized}.xlsx')
+    if not os.path.exists(excel_filename):
+        logging.error(f'ファイルが存在しません: {excel_filename}')
+        return None
+
+    # 行範囲指定時はブックを保存しない（分割した数だけ開かれる）ので読み取り専用で開く
+    wb = load_workbook(excel_filename, read_only=bool(row_range))
+    sheet = ensure_date_sheet_exists(wb, date_str)
+
+    if row_range:
+        account_icons = read_icon_sheet(wb['ユーザーアイコン']) if 'ユーザーアイコン' in wb.sheetnames else {}
+    else:
+        account_icons = read_icon_sheet(ensure_icon_sheet(wb))
+    song_accounts: set[str] = set()
+    profile_batch = ProfileLookupBatch()
+
+    if row_range:
+        min_row, max_row = row_range
+        journal = RowJournal.for_song(song_name, date_str, suffix=f'.r{min_row}-{max_row}')
+        label = f'{song_name} [{min_row}-{max_row}行]'
+    else:
+        min_row, max_row = 2, None
+        journal = RowJournal.for_song(song_name, date_str)
+        label = song_name
+
+    # ブックを書き込みスレッドへ渡す前に、処理対象の行だけ控えておく
+    total_urls_count = 0
+    already_filled = 0
+    pending_rows: list[tuple[int, str]] = []
+    for row_idx, row in enumerate(sheet.iter_rows(min_row=min_row, max_row=max_row, max_col=12), start=min_row):
+        link = row[10].value
+        if not link:
+            continue
+        total_urls_count += 1
+        if _is_row_filled(row):
+            already_filled += 1
+        else:
+            pending_rows.append((row_idx, link))
+
+    song_written = 0
+    song_carried = 0
+    row_data: dict[int, dict] = {}
+    failures: dict[str, int] = {}
+    failed_rows: list[tuple[int, str]] = []
+    timings = {"navigate_sec": 0.0, "extract_sec": 0.0, "profile_sec": 0.0, "avatar_wait_sec": 0.0,
+               "save_sec": 0.0}
+
+    def record_failure(row_idx: int, reason: str):
+        failures[reason] = failures.get(reason, 0) + 1
+        if len(failed_rows) < 50:
+            failed_rows.append((row_idx, reason))
+
+    planner = RefreshPlanner(wb, sheet.title) if sess.use_refresh_policy else None
+    writer = None
+    if not row_range:
+        writer = WorkbookWriter(wb, sheet, excel_filename, int(CFG.get("WRITER_QUEUE_SIZE", 500)))
+    else:
+        wb.close()
+
+    def emit(row_idx: int, link: str, data: dict, journaled: bool = False):
+        row_data[row_idx] = data
+        if writer is not None:
+            writer.put_row(row_idx, data)
+        if not journaled:
+            journal.append(link, data)
+
+    closed = False
+    try:
+        journaled = journal.load()
+        if journaled:
+            logging.info(f'[機能2] ジャーナルから再開: {label} ({len(journaled)}件)')
+
+        to_fetch: list[tuple[int, str]] = []
+        for row_idx, link in pending_rows:
+            if link in journaled:
+                data = journaled[link]
+                emit(row_idx, link, data, journaled=True)
+                account_name = data.get('アカウント名')
+                if account_name and account_name not in account_icons and data.get('アバターURL'):
+                    song_accounts.add(account_name)
+                    icon_path = avatars.submit(account_name, data['アバターURL'])
+                    if icon_path:
+                        account_icons[account_name] = icon_path
+                song_written += 1
+                continue
+
+            if planner is not None:
+                carried = planner.carry_forward(link)
+                if carried is not None:
+                    emit(row_idx, link, carried)
+                    song_carried += 1
+                    continue
+
+            if sess.dead_posts.should_skip(_video_id_from_url(str(link))):
+                record_failure(row_idx, 'dead_cached')
+                continue
+
+            to_fetch.append((row_idx, link))
+
+        for row_idx, link, handle, nav_timed_out in sess.prefetcher.iterate(to_fetch):
+            if is_stopped():
+                logging.info('#機能2 行ループで停止フラグ検知 → 残り行の処理を中断')
+                break
+
+            t_nav = time.perf_counter()
+            trace = _trace
+            if trace is not None:
+                trace.begin_row()
+                trace.add('navigate', sess.prefetcher.last_load_sec)
+            if nav_timed_out:
+                record_failure(row_idx, 'navigate_timeout')
+
+            with trace_stage('probe'):
+                st = probe_page(driver, 'video', 4.5)
+            if st['error']:
+                with trace_stage('error_retry'):
                     try:
-                        messagebox.showwarning('警告', 'ファイルが開かれているため保存できません。\n閉じて OK を押してください。')
+                        driver.refresh()
                     except Exception:
                         pass
-                except Exception as e:
-                    logging.error(f'保存中エラー（機能1）: {e}')
+                    st = probe_page(driver, 'video', 3.0)
+                if st['error']:
+                    logging.info('エラーページが続くためスキップ')
+                    timings["navigate_sec"] += time.perf_counter() - t_nav
+                    record_failure(row_idx, 'error_page')
+                    if st['gone']:
+                        # 「不明なエラー」等は一時的なことが多いので、消えた投稿としては数えない
+                        sess.dead_posts.record_failure(_video_id_from_url(str(link)), 'gone')
+                    if trace is not None:
+                        trace.end_row(label, row_idx, 'error_page',
+                                      time.perf_counter() - t_nav + sess.prefetcher.last_load_sec)
+                    continue
+
+            t_extract = time.perf_counter()
+            timings["navigate_sec"] += t_extract - t_nav
+            with trace_stage('extract'):
+                data = extract_video_data(driver, handle, sess.follower_window_handle, sess.follower_cache,
+                                          defer_profile=sess.defer_profile)
+            if planner is not None:
+                planner.fill_immutable(link, data)
+            timings["extract_sec"] += time.perf_counter() - t_extract
+            emit(row_idx, link, data)
+            collect_stats(driver)
+            no_stats = data.get('いいね数') in (None, '')
+            if no_stats:
+                record_failure(row_idx, 'no_stats')
+            else:
+                sess.dead_posts.record_ok(_video_id_from_url(str(link)))
+            if trace is not None:
+                trace.end_row(label, row_idx, 'no_stats' if no_stats else 'ok',
+                              time.perf_counter() - t_nav + sess.prefetcher.last_load_sec)
+            if sess.defer_profile and ProfileLookupBatch.needs_lookup(data):
+                profile_batch.add(str(data['アカウント名']).strip(), row_idx, data)
+
+            account_name = data.get('アカウント名')
+            avatar_url = data.get('アバターURL')
+            if account_name and avatar_url and account_name not in account_icons:
+                song_accounts.add(account_name)
+                icon_path = avatars.submit(account_name, avatar_url)
+                if icon_path:
+                    account_icons[account_name] = icon_path
+
+            song_written += 1
+
+        t_phase = time.perf_counter()
+        if len(profile_batch):
+            profiles = profile_batch.resolve(driver, sess.original_window, sess.follower_window_handle,
+                                             sess.follower_cache)
+            patched = profile_batch.patch(profiles)
+            # ジャーナルはシートのK列のリンクで引くので、ページのURLではなくそちらで記録する
+            link_by_row = dict(to_fetch)
+            for row_idx, data in patched:
+                emit(row_idx, link_by_row.get(row_idx) or data.get('動画リンク(URL)'), data)
+            logging.info(f'[機能2] プロフィール反映: {len(patched)}行')
+        timings["profile_sec"] = time.perf_counter() - t_phase
+
+        t_phase = time.perf_counter()
+        avatars.wait_idle(float(CFG.get("AVATAR_FLUSH_TIMEOUT_SEC", 30)))
+        new_icons = avatars.completed(song_accounts)
+        account_icons.update(new_icons)
+        timings["avatar_wait_sec"] = time.perf_counter() - t_phase
+
+        filled = already_filled + sum(1 for d in row_data.values() if _is_data_filled(d))
+        logging.info(f'{label} - 最終取得件数: {song_written}, 引き継ぎ件数: {song_carried}, '
+                     f'総URL件数: {total_urls_count}')
+
+        if writer is None:
+            journal.append_icons(new_icons)
+            journal.close()
+        else:
+            writer.put_icons(account_icons)
+            if writer.close(save=True):
+                journal.discard()
+            else:
+                journal.close()
+                record_failure(0, 'save_failed')
+                logging.warning(f'[機能2] 取得結果はジャーナルに残しました（次回実行時に反映）: {journal.path}')
+            timings["save_sec"] = writer.save_sec
+        closed = True
+    finally:
+        if not closed:
+            # 行ループ等で例外になっても書き込みスレッドとジャーナルは必ず閉じる
+            # （取得済みの行はジャーナルに残っているので、次回実行時に反映される）
+            if writer is not None:
+                writer.close(save=False)
+            journal.close()
+
+    if _trace is not None:
+        _trace.row = None
+        _trace.song(label, {"profile_batch": timings["profile_sec"], "avatar_wait": timings["avatar_wait_sec"],
+                            "save": timings["save_sec"]})
+
+    return {"song_name": song_name, "row_range": row_range, "total": total_urls_count, "filled": filled,
+            "written": song_written, "carried": song_carried, "failures": failures,
+            "failed_rows": failed_rows, "timings": {k: round(v, 2) for k, v in timings.items()}}
+
+
+def plan_song_chunks(save_path, song_name: str, date_str: str, chunk_rows: int) -> list:
+    """
+    曲の日付シートを行範囲のタスクに分割する。
+
+    戻り値: [((開始行, 終了行), URL件数), ...]。分割不要なら [(None, URL件数)]
+    """
+    excel_filename = os.path.join(save_path, f'{sanitize_filename(song_name)}.xlsx')
+    url_rows: list[int] = []
+    try:
+        wb = load_workbook(excel_filename, read_only=True)
+    except Exception:
+        return [(None, 0)]
+    try:
+        if date_str in wb.sheetnames:
+            ws = wb[date_str]
+        else:
+            like_dates = sorted(s for s in wb.sheetnames if re.fullmatch(r'\d{8}', s))
+            ws = wb[like_dates[-1]] if like_dates else None
+        if ws is not None:
+            for i, row in enumerate(ws.iter_rows(min_row=2, min_col=11, max_col=11, values_only=True), start=2):
+                if row and row[0]:
+                    url_rows.append(i)
+    finally:
+        wb.close()
+    last_row = url_rows[-1] if url_rows else 1
+    if chunk_rows <= 0 or last_row - 1 <= chunk_rows:
+        return [(None, len(url_rows))]
+    chunks = []
+    for a in range(2, last_row + 1, chunk_rows):
+        b = min(a + chunk_rows - 1, last_row)
+        chunks.append(((a, b), sum(1 for r in url_rows if a <= r <= b)))
+    return chunks
+
+
+SONG_HISTORY_PATH = os.path.join(exec_dir, 'song_history.json')
+
+
+class SongHistory:
+    """
+    曲ごとの所要時間とURL件数の履歴（並列実行の順序決めに使う）。
+    """
+
+    def __init__(self, path: str = SONG_HISTORY_PATH):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        try:
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f) or {}
+        except Exception as e:
+            logging.info(f'所要時間履歴の読込失敗: {e}')
+
+    def sec_per_url(self, song_name: str) -> float | None:
+        ent = self.entries.get(song_name)
+        if ent and ent.get('urls'):
+            return float(ent['duration_sec']) / max(1, int(ent['urls']))
+        return None
+
+    def default_sec_per_url(self) -> float:
+        rates = sorted(r for r in (self.sec_per_url(k) for k in self.entries) if r)
+        if rates:
+            return rates[len(rates) // 2]
+        return float(CFG.get("DEFAULT_SEC_PER_URL", 4.0))
+
+    def estimate(self, song_name: str, url_count: int) -> float:
+        rate = self.sec_per_url(song_name) or self.default_sec_per_url()
+        return rate * max(0, int(url_count))
+
+    def record(self, song_name: str, duration_sec: float, url_count: int):
+        if duration_sec <= 0 or url_count <= 0:
+            return
+        self.entries[song_name] = {'duration_sec': round(float(duration_sec), 1), 'urls': int(url_count),
+                                   'updated': datetime.now().strftime('%Y/%m/%d %H:%M')}
+
+    def save(self):
+        try:
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.info(f'所要時間履歴の保存失敗: {e}')
+
+
+def order_longest_first(tasks: list, estimates: list[float], workers: int) -> tuple[list, float]:
+    """
+    見積もり所要時間の長いタスクから順に並べる（LPT）。
+
+    戻り値: (並べ替えたタスク, workers 台で実行したときの予測所要秒)
+    """
+    order = sorted(range(len(tasks)), key=lambda i: estimates[i], reverse=True)
+    loads = [0.0] * max(1, workers)
+    for i in order:
+        k = loads.index(min(loads))
+        loads[k] += estimates[i]
+    return [tasks[i] for i in order], max(loads)
+
+
+def merge_song_journals(save_path, song_name: str, date_str: str, journal_paths: list[str]) -> dict | None:
+    """
+    行範囲ごとのジャーナルを曲のブックへまとめて反映し、1回だけ保存する。
+    """
+    excel_filename = os.path.join(save_path, f'{sanitize_filename(song_name)}.xlsx')
+    journals = [RowJournal(p) for p in journal_paths if os.path.isfile(p)]
+    if not journals or not os.path.exists(excel_filename):
+        return None
+
+    records: dict[str, dict] = {}
+    icons: dict[str, str] = {}
+    for j in journals:
+        for url, data in j.load().items():
+            records.setdefault(url, {}).update(data)
+        icons.update(j.icons)
+
+    wb = load_workbook(excel_filename)
+    sheet = ensure_date_sheet_exists(wb, date_str)
+    total = filled = applied = 0
+    for row in sheet.iter_rows(min_row=2, max_col=12):
+        link = row[10].value
+        if not link:
+            continue
+        total += 1
+        if link in records:
+            write_video_data_to_row(sheet, row, records[link])
+            applied += 1
+        if _is_row_filled(row):
+            filled += 1
+    update_icon_sheet(ensure_icon_sheet(wb), icons)
+
+    if save_workbook_with_retry(wb, excel_filename, '（機能2統合）'):
+        for j in journals:
+            j.discard()
+    logging.info(f'[機能2] 統合: {song_name} 反映{applied}件 ({len(journals)}ジャーナル)')
+    return {"song_name": song_name, "total": total, "filled": filled}
+
+
+_JOURNAL_NAME_RE = re.compile(r'(?P<song>.+)_(?P<date>\d{8})(?:\.r\d+-\d+)?\.jsonl')
+
+
+def recover_stale_journals(save_path, date_str: str) -> int:
+    """
+    date_str より前の日付のジャーナル（保存失敗・異常終了で残ったもの）を、その日付のシートへ反映する。
+    ブックか日付シートが無くて反映できないものは、JOURNAL_KEEP_DAYS を過ぎたら削除する。
+
+    戻り値: 反映した曲数
+    """
+    try:
+        names = os.listdir(JOURNAL_DIR)
+    except OSError:
+        return 0
+    groups: dict[tuple[str, str], list[str]] = {}
+    for name in names:
+        m = _JOURNAL_NAME_RE.fullmatch(name)
+        if m and m.group('date') < date_str:
+            groups.setdefault((m.group('song'), m.group('date')), []).append(os.path.join(JOURNAL_DIR, name))
+
+    keep_sec = int(CFG.get("JOURNAL_KEEP_DAYS", 7)) * 86400
+    recovered = 0
+    for (song, journal_date), paths in sorted(groups.items()):
+        excel_filename = os.path.join(save_path, f'{song}.xlsx')
+        has_sheet = False
+        if os.path.exists(excel_filename):
+            try:
+                wb = load_workbook(excel_filename, read_only=True)
+                has_sheet = journal_date in wb.sheetnames
+                wb.close()
+            except Exception as e:
+                logging.info(f'[機能2] 残存ジャーナルの反映先を読めませんでした: {excel_filename} | {e}')
+        if has_sheet:
+            try:
+                if merge_song_journals(save_path, song, journal_date, paths):
+                    recovered += 1
+                    continue
+            except Exception as e:
+                logging.error(f'[機能2] 残存ジャーナルの反映で例外: {song} {journal_date} | {e}')
+        for path in paths:
+            try:
+                if time.time() - os.path.getmtime(path) > keep_sec:
+                    os.remove(path)
+                    logging.warning(f'[機能2] 反映できないジャーナルを削除: {path}')
+                else:
+                    logging.warning(f'[機能2] 反映できないジャーナルがあります: {path}')
+            except OSError:
+                pass
+    if recovered:
+        logging.info(f'[機能2] 前日以前のジャーナルを反映: {recovered}曲')
+    return recovered
+
+
+def _function2_core(save_path, song_urls, headless=False,
+                    per_song_timeout: int = 300, skip_on_timeout: bool = False,
+                    profile_name: str | None = None, work_date_str: str | None = None,
+                    chromedriver_path: str | None = None,
+                    row_range: tuple[int, int] | None = None) -> list[dict]:
+    sess = Function2Session(headless=headless, per_song_timeout=per_song_timeout,
+                            profile_name=profile_name, chromedriver_path=chromedriver_path)
+    results = []
+    try:
+        fixed_date_str = work_date_str or datetime.now().strftime('%Y%m%d')
+        for song_name, _ in song_urls:
+            if is_stopped():
+                logging.info('#機能2 停止フラグ検知 → 中断')
+                break
+            res = _function2_song(sess, save_path, song_name, fixed_date_str, row_range=row_range)
+            if res:
+                results.append(res)
+    finally:
+        sess.close()
+    return results
+
+
+def function2(save_path, song_urls, headless=False,
+              per_song_timeout: int = 300, skip_on_timeout: bool = False,
+              profile_name: str | None = None, work_date_str: str | None = None,
+              chromedriver_path: str | None = None,
+              row_range: tuple[int, int] | None = None) -> list[dict]:
+    logging.info('#機能2 開始 (timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
+    trace_run_id = new_trace_run_id()
+    DeadPostCache().compact()
+    if row_range is None:
+        # 行範囲指定（分割実行）は同じ曲を別プロセスも処理しているので、統合側に任せる
+        recover_stale_journals(save_path, work_date_str or datetime.now().strftime('%Y%m%d'))
+    start_trace(trace_run_id, profile_name)
+    try:
+        return _function2_core(save_path, song_urls, headless=headless, per_song_timeout=per_song_timeout,
+                               skip_on_timeout=skip_on_timeout, profile_name=profile_name,
+                               work_date_str=work_date_str, chromedriver_path=chromedriver_path,
+                               row_range=row_range)
+    finally:
+        stop_trace()
+        log_trace_report(trace_run_id)
+        logging.info('#機能2 終了')
+
+
+def _function2_worker_loop(init: dict, task_q, result_q):
+    """
+    機能2の常駐ワーカープロセス。1つのプロファイルとブラウザを保持したまま
+    task_q から受け取ったタスクを順に処理し、結果を (プロファイル名, 結果) で result_q へ返す。
+    ブラウザは失敗時と WORKER_RECYCLE_SONGS 件ごとに作り直す。None を受け取ったら終了する。
+    """
+    global external_stop
+    _worker_bootstrap(init.get("log_queue"), f'並列機能2ワーカー @ {init["profile_name"]}')
+    external_stop = init.get("shared_stop")
+    profile_name = init["profile_name"]
+    recycle_after = int(CFG.get("WORKER_RECYCLE_SONGS", 20))
+    sess = None
+    served = 0
+    start_trace(init.get("trace_run_id"), profile_name)
+
+    try:
+        while True:
+            payload = task_q.get()
+            if payload is None:
+                break
+
+            song_name, _ = payload["song"]
+            row_range = payload.get("row_range")
+            fatal = False
+            fatal_reason = ''
+            recycle = False
+            song_result = None
+
+            try:
+                if sess is None:
                     try:
-                        messagebox.showerror('エラー', f'保存中にエラーが発生しました: {e}')
+                        time.sleep(random.uniform(0.2, 0.8))
                     except Exception:
                         pass
-                    break
+                    sess = Function2Session(headless=init["headless"], per_song_timeout=init["per_song_timeout"],
+                                            profile_name=profile_name,
+                                            chromedriver_path=init.get("chromedriver_path"))
+                    served = 0
+                if not is_stopped():
+                    song_result = _function2_song(sess, init["save_path"], song_name, init["work_date_str"],
+                                                  row_range=row_range)
+                served += 1
+            except DriverInitFatalError as e:
+                logging.error(f'[並列ワーカー] Chrome起動致命的エラー: {song_name} | {e}')
+                fatal = True
+                fatal_reason = 'driver_init_failed'
+                try:
+                    if external_stop is not None:
+                        external_stop.set()
+                except Exception:
+                    pass
+            except Exception as e:
+                recycle = True
+                if _is_invalid_session_error(e):
+                    logging.error(f'[並列ワーカー] セッションエラー(この曲のみ失敗): {song_name} | {e}')
+                    fatal_reason = 'invalid_session'
+                else:
+                    logging.error(f'[並列ワーカー] 例外: {song_name} | {e}')
+                    fatal_reason = 'exception'
 
-            logging.info(f'[機能1] {song_name}: 取得URL件数={len(urls)}')
+            if sess is not None and (recycle or (recycle_after > 0 and served >= recycle_after)):
+                logging.info(f'[並列ワーカー] ブラウザを再起動します @ {profile_name} (処理済み{served}件)')
+                try:
+                    sess.close()
+                except Exception:
+                    pass
+                sess = None
 
-        except TimeoutException as te:
-            logging.warning(f'[機能1] タイムアウト: {song_name} | {te}')
-            consecutive_errors += 1
-            if not skip_on_timeout:
-                raise
-        except Exception as e:
-            logging.error(f'[機能1] 例外: {song_name} | {e}', exc_info=True)
-            consecutive_errors += 1
-            if not skip_on_timeout:
-                raise
-        finally:
-            safe_quit(driver)
+            res = _function2_task_result(init, payload, song_result, fatal, fatal_reason)
+            result_q.put((profile_name, res))
+    finally:
+        if sess is not None:
+            try:
+                sess.close()
+            except Exception:
+                pass
+        stop_trace()
 
-    logging.info('#機能1 終了')
 
+# この失敗が1件でもあれば曲ごとリトライ対象にする（ワーカー側で曲の処理が例外終了した）
+_FUNCTION2_RETRY_FAILURES = ('exception', 'invalid_session', 'worker_died')
 
-# === 機能2 =====================================
-def _function2_core(save_path, song_urls, headless=False,
-                    per_song_timeout: int = 300, skip_on_timeout: bool = False,
-                    profile_name: str | None = None, work_date_str: str | None = None,
-                    chromedriver_path: str | None = None):
-    ensure_dir(images_dir)
-    driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, profile_name=profile_name, chromedriver_path=chromedriver_path)
-    if not driver:
-        logging.error('WebDriver初期化に失敗（機能2）')
-        raise DriverInitFatalError('WebDriver初期化に失敗（機能2）')
 
-    enable_speed_blocking(driver)
+def _function2_task_result(init: dict, payload: dict, song_result: dict | None,
+                           fatal: bool, fatal_reason: str) -> dict:
+    """
+    _function2_song の集計をそのまま結果にする（ブックは読み直さない）。
+    曲の途中で例外になった場合は fatal_reason を失敗件数に入れて、リトライ対象に残す。
+    """
+    song_name, _ = payload["song"]
+    res = song_result or {}
+    failures = dict(res.get("failures") or {})
+    if fatal_reason and not fatal:
+        failures[fatal_reason] = failures.get(fatal_reason, 0) + 1
 
+    elapsed = 0
     try:
-        try:
-            original_window = driver.current_window_handle
-            driver.execute_script("window.open('');")
-            follower_window_handle = driver.window_handles[-1]
-        except Exception:
-            follower_window_handle = driver.current_window_handle
+        elapsed = int(payload.get("_tstart") and (time.time() - payload["_tstart"]) or 0)
+    except Exception:
+        pass
 
-        operations_count = 0
-        INTERMEDIATE_SAVE_EVERY = 50
-        follower_cache: dict[str, tuple] = {}
-        session = requests.Session()
-        fixed_date_str = work_date_str or datetime.now().strftime('%Y%m%d')
+    return {
+        "song_name": song_name, "row_range": payload.get("row_range"), "total": res.get("total", 0),
+        "filled": res.get("filled", 0), "written": res.get("written", 0), "carried": res.get("carried", 0),
+        "failures": failures, "failed_rows": res.get("failed_rows", []),
+        "timings": res.get("timings", {}), "elapsed_sec": elapsed, "profile": init["profile_name"],
+        "fatal": fatal, "fatal_reason": fatal_reason
+    }
 
-        for song_name, _ in song_urls:
-            if is_stopped():
-                logging.info('#機能2 停止フラグ検知 → 中断')
-                break
 
-            sanitized = sanitize_filename(song_name)
-            excel_filename = os.path.join(save_path, f'{sanitized}.xlsx')
-            if not os.path.exists(excel_filename):
-                logging.error(f'ファイルが存在しません: {excel_filename}')
-                continue
+def _merge_counts(dst: dict, src: dict | None):
+    for k, v in (src or {}).items():
+        dst[k] = dst.get(k, 0) + v
 
-            wb = load_workbook(excel_filename)
-            sheet = ensure_date_sheet_exists(wb, fixed_date_str)
 
-            if 'ユーザーアイコン' not in wb.sheetnames:
-                icon = wb.create_sheet(title='ユーザーアイコン')
-                icon.append(['アカウント名', 'アイコンパス'])
-                icon.column_dimensions['A'].width = 25
-                icon.column_dimensions['B'].width = 40
-            icon_sheet = wb['ユーザーアイコン']
+def _format_counts(counts: dict) -> str:
+    return ', '.join(f'{k}={v}' for k, v in sorted(counts.items()))
 
-            account_icons = {}
-            for r in icon_sheet.iter_rows(min_row=2):
-                if r[0].value and r[1].value:
-                    account_icons[str(r[0].value)] = str(r[1].value)
 
-            total_urls_count = sum(1 for r in sheet.iter_rows(min_row=2, min_col=11, max_col=11) if r[0].value)
-            song_written = 0
+def _preinstall_chromedriver() -> str | None:
+    try:
+        chromedriver_path = resolve_chromedriver()
+        if chromedriver_path:
+            logging.info(f'chromedriverをインストール/確認しました: {chromedriver_path}')
+        return chromedriver_path
+    except Exception as e:
+        logging.error(f'chromedriverの事前インストールに失敗: {e}')
+        return None
 
-            for row in sheet.iter_rows(min_row=2, max_col=12):
-                if is_stopped():
-                    logging.info('#機能2 行ループで停止フラグ検知 → 残り行の処理を中断')
-                    break
 
-                if all(cell.value not in (None, '') for cell in row[:10]) and row[10].value and row[11].value:
-                    continue
+def _unique_songs(song_urls) -> list:
+    unique = []
+    seen = set()
+    for name, url in song_urls:
+        if name not in seen:
+            unique.append((name, url))
+            seen.add(name)
+    return unique
 
-                link = row[10].value
-                if not link:
-                    continue
 
-                driver.switch_to.window(original_window)
-                try:
-                    driver.get(link)
-                except TimeoutException:
-                    try:
-                        driver.execute_script("window.stop();")
-                    except Exception:
-                        pass
+class _MemoryThrottle:
+    """
+    空きメモリが MIN_FREE_MEM_MB を下回ったら同時実行数を1つ下げ、回復したら戻す。
+    """
 
-                wait_dom_interactive(driver, 2.0)
-                wait_rehydration_json(driver, 2.5)
+    def __init__(self, label: str, max_limit: int):
+        self.label = label
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.min_free_mb = int(CFG.get("MIN_FREE_MEM_MB", 1024))
 
-                if _detect_error_page(driver):
-                    try:
-                        driver.refresh()
-                    except Exception:
-                        pass
-                    wait_dom_interactive(driver, 1.5)
-                    wait_rehydration_json(driver, 1.5)
-                    if _detect_error_page(driver):
-                        logging.info('エラーページが続くためスキップ')
-                        continue
+    def adjust(self):
+        free_mb = _free_memory_mb()
+        if free_mb is None:
+            return
+        if free_mb < self.min_free_mb and self.limit > 1:
+            self.limit -= 1
+            logging.warning(f'[{self.label}] 空きメモリ低下({free_mb}MB) → 同時実行数を{self.limit}に制限')
+        elif free_mb >= self.min_free_mb * 2 and self.limit < self.max_limit:
+            self.limit += 1
+            logging.info(f'[{self.label}] 空きメモリ回復({free_mb}MB) → 同時実行数を{self.limit}に戻します')
 
-                data = extract_video_data(driver, original_window, follower_window_handle, follower_cache)
-                write_video_data_to_row(sheet, row, data)
 
-                account_name = data.get('アカウント名')
-                avatar_url = data.get('アバターURL')
-                if account_name and avatar_url and account_name not in account_icons:
-                    try:
-                        icon_filename = f"{sanitize_filename(account_name)}.jpg"
-                        icon_path = os.path.join(images_dir, icon_filename)
-                        resp = session.get(avatar_url, stream=True, timeout=5)
-                        if resp.status_code == 200:
-                            with open(icon_path, 'wb') as f:
-                                for chunk in resp.iter_content(1024):
-                                    f.write(chunk)
-                            account_icons[account_name] = f"images/{icon_filename}"
-                            logging.info(f'アイコン保存: {account_name} -> images/{icon_filename}')
-                    except Exception as e:
-                        logging.info(f'アイコン保存失敗: {e}')
-
-                operations_count += 1
-                song_written += 1
+def _run_profile_pool(label: str, worker_fn, tasks, profiles: list[str], make_payload, on_result,
+                      describe=lambda t: t[0]):
+    """
+    Chromeプロファイルを1つずつ占有するワーカープロセスへタスクを順に割り当てる。
+    同じプロファイルを同時に2つのワーカーが使うことはない。
+    on_result(res, prof) が True を返したら以降のタスク投入を止める（致命的エラー）。
+    空きメモリが MIN_FREE_MEM_MB を下回っている間は同時実行数を下げる。
+    """
+    prof_deque = deque(profiles)
+    tasks_iter = iter(tasks)
+    futures = {}
+    halted = False
+    throttle = _MemoryThrottle(label, len(profiles))
+
+    with ProcessPoolExecutor(max_workers=len(profiles), initializer=_worker_bootstrap,
+                             initargs=(_log_queue, f'{label}ワーカー')) as ex:
+        def submit_next() -> bool:
+            if halted or is_stopped() or not prof_deque or len(futures) >= throttle.limit:
+                return False
+            try:
+                task = next(tasks_iter)
+            except StopIteration:
+                return False
+            prof = prof_deque.popleft()
+            fut = ex.submit(worker_fn, make_payload(task, prof))
+            futures[fut] = prof
+            logging.info(f'[{label}] START: {describe(task)} @ {prof}')
+            return True
 
-                if operations_count % INTERMEDIATE_SAVE_EVERY == 0:
-                    while True:
-                        try:
-                            wb.save(excel_filename)
-                            break
-                        except PermissionError:
-                            try:
-                                messagebox.showwarning('警告', 'ファイルが開かれているため保存できません。\n閉じて OK を押してください。')
-                            except Exception:
-                                pass
-                        except Exception as e:
-                            logging.error(f'保存中エラー（機能2途中）: {e}')
-                            break
-
-            if icon_sheet.max_row > 1:
-                icon_sheet.delete_rows(2, icon_sheet.max_row - 1)
-            for acc, p in account_icons.items():
-                icon_sheet.append([acc, p])
-
-            logging.info(f'{song_name} - 最終取得件数: {song_written}, 総URL件数: {total_urls_count}')
-
-            while True:
+        while submit_next():
+            pass
+
+        while futures:
+            done, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+            for fut in done:
+                prof = futures.pop(fut)
                 try:
-                    wb.save(excel_filename)
-                    break
-                except PermissionError:
-                    try:
-                        messagebox.showwarning('警告', 'ファイルが開かれているため保存できません。\n閉じて OK を押してください。')
-                    except Exception:
-                        pass
+                    res = fut.result()
+                    if res and on_result(res, prof):
+                        halted = True
+                except CancelledError:
+                    logging.info(f'[{label}] 取消 @ {prof}')
                 except Exception as e:
-                    logging.error(f'保存中エラー（機能2）: {e}')
-                    try:
-                        messagebox.showerror('エラー', f'保存中にエラーが発生しました: {e}')
-                    except Exception:
-                        pass
-                    break
-    finally:
-        safe_quit(driver)
+                    logging.error(f'[{label}] ワーカー例外: {e}')
+                prof_deque.append(prof)
+            throttle.adjust()
+            while submit_next():
+                pass
 
 
-def function2(save_path, song_urls, headless=False,
-              per_song_timeout: int = 300, skip_on_timeout: bool = False,
-              profile_name: str | None = None, work_date_str: str | None = None,
-              chromedriver_path: str | None = None):
-    logging.info('#機能2 開始 (timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
+def _run_resident_workers(label: str, worker_loop, tasks, profiles: list[str], make_init, make_payload,
+                          on_result, describe=lambda t: t[0], make_failure=None, stop_event=None):
+    """
+    プロファイルごとに常駐ワーカープロセスを1つ起動し、空いたワーカーへタスクを1件ずつ渡す。
+    tasks に TaskFeed を渡すと、実行中に追加されたタスクも閉じられるまで待って処理する。
+    worker_loop(init, task_q, result_q) は (プロファイル名, 結果) を result_q へ返すこと。
+    異常終了したワーカーは次のタスクを渡すときに起動し直す。処理中だったタスクは
+    make_failure(payload, プロファイル名, 'worker_died') の結果を on_result へ渡す。
+    on_result と同時実行数の扱いは _run_profile_pool と同じ。空きメモリ低下で同時実行数を
+    下げたときは、上限を超えた分の待機中ワーカーを終了させてブラウザのメモリを空ける。
+    終了時に戻らないワーカーは、stop_event（ワーカーの停止フラグ）を立ててしばらく待ってから
+    強制終了する（ログキューへの書き出し途中で止めるとキューが壊れるため）。
+    """
+    import multiprocessing as mp
+
+    result_q = mp.Queue()
+    workers: dict[str, tuple] = {}
+    retired: list = []
+    idle = deque(profiles)
+    busy: dict[str, tuple] = {}
+    feed = tasks if isinstance(tasks, TaskFeed) else TaskFeed(list(tasks))
+    halted = False
+    throttle = _MemoryThrottle(label, len(profiles))
+
+    def ensure_worker(prof):
+        entry = workers.get(prof)
+        if entry and entry[0].is_alive():
+            return entry[1]
+        task_q = mp.Queue()
+        proc = mp.Process(target=worker_loop, args=(make_init(prof), task_q, result_q), daemon=True)
+        proc.start()
+        workers[prof] = (proc, task_q)
+        return task_q
+
+    def submit_next() -> bool:
+        if halted or is_stopped() or not idle or len(busy) >= throttle.limit:
+            return False
+        try:
+            task = feed.get_nowait()
+        except StopIteration:
+            return False
+        if task is None:
+            return False
+        prof = idle.popleft()
+        payload = make_payload(task, prof)
+        ensure_worker(prof).put(payload)
+        busy[prof] = (task, payload)
+        logging.info(f'[{label}] START: {describe(task)} @ {prof}')
+        return True
+
+    def handle_result(prof, res):
+        nonlocal halted
+        try:
+            if res and on_result(res, prof):
+                halted = True
+        except Exception as e:
+            logging.error(f'[{label}] 結果処理で例外: {e}')
+
+    def release_idle_workers():
+        live = [p for p, (proc, _) in workers.items() if proc.is_alive()]
+        excess = len(live) - throttle.limit
+        for prof in list(idle):
+            if excess <= 0:
+                break
+            if prof not in live:
+                continue
+            proc, task_q = workers.pop(prof)
+            try:
+                task_q.put(None)
+            except Exception:
+                pass
+            retired.append(proc)
+            excess -= 1
+            logging.info(f'[{label}] 同時実行数の制限に合わせて待機中のワーカーを終了 @ {prof}')
+
     try:
-        _function2_core(save_path, song_urls, headless=headless, per_song_timeout=per_song_timeout,
-                        skip_on_timeout=skip_on_timeout, profile_name=profile_name, work_date_str=work_date_str,
-                        chromedriver_path=chromedriver_path)
+        while submit_next():
+            pass
+
+        while busy or not (halted or is_stopped() or feed.exhausted()):
+            try:
+                prof, res = result_q.get(timeout=1.0)
+            except queue.Empty:
+                for prof in list(busy):
+                    if not workers[prof][0].is_alive():
+                        task, payload = busy.pop(prof)
+                        logging.error(f'[{label}] ワーカー異常終了: {describe(task)} @ {prof}')
+                        idle.append(prof)
+                        if make_failure is not None:
+                            handle_result(prof, make_failure(payload, prof, 'worker_died'))
+            else:
+                busy.pop(prof, None)
+                idle.append(prof)
+                handle_result(prof, res)
+                throttle.adjust()
+                release_idle_workers()
+            while submit_next():
+                pass
     finally:
-        logging.info('#機能2 終了')
+        for proc, task_q in workers.values():
+            try:
+                task_q.put(None)
+            except Exception:
+                pass
+        procs = retired + [proc for proc, _ in workers.values()]
+        for proc in procs:
+            proc.join(timeout=60)
+        stuck = [proc for proc in procs if proc.is_alive()]
+        if stuck and stop_event is not None:
+            logging.warning(f'[{label}] 終了しないワーカーに停止を要求します ({len(stuck)}件)')
+            try:
+                stop_event.set()
+            except Exception:
+                pass
+            for proc in stuck:
+                proc.join(timeout=15)
+        for proc in stuck:
+            if proc.is_alive():
+                logging.warning(f'[{label}] ワーカーが終了しないため強制終了します (pid={proc.pid})')
+                proc.terminate()
+                proc.join(timeout=5)
+        for _, task_q in workers.values():
+            # 相手が強制終了されていても、このプロセスの終了時に送信スレッドを待たない
+            task_q.cancel_join_thread()
+
+
+def _free_memory_mb() -> int | None:
+    if not psutil:
+        return None
+    try:
+        return int(psutil.virtual_memory().available / (1024 * 1024))
+    except Exception:
+        return None
 
 
-def _function2_worker(payload: dict):
-    global external_stop
-    external_stop = payload.get("shared_stop")
+def size_worker_pool(requested: int, task_count: int) -> int:
+    """
+    CPUコア数と空きメモリから同時ワーカー数を決める（要求数・タスク数が上限）。
+    """
+    workers = max(1, min(int(requested), int(task_count)))
+    cpu = None
     try:
-        time.sleep(random.uniform(0.2, 0.8))
+        cpu = (psutil.cpu_count(logical=True) if psutil else None) or os.cpu_count()
     except Exception:
-        pass
+        cpu = os.cpu_count()
+    if cpu:
+        by_cpu = max(1, cpu // max(1, int(CFG.get("CPU_CORES_PER_WORKER", 2))))
+        workers = min(workers, by_cpu)
+    free_mb = _free_memory_mb()
+    if free_mb is not None:
+        usable = free_mb - int(CFG.get("RESERVED_MEM_MB", 2048))
+        by_mem = max(1, usable // max(1, int(CFG.get("WORKER_MEM_MB", 1024))))
+        workers = min(workers, by_mem)
+    logging.info(f'[並列] ワーカー数決定: 要求{requested} → {workers} (CPU={cpu}, 空きメモリ={free_mb}MB)')
+    return workers
+
+
+def provision_worker_profiles(count: int) -> list[str]:
+    """
+    CHROME_PROFILE_POOL で足りない分の分離プロファイルを自動作成する。
+    追加分は auto_w<N> という名前で、プール内のプロファイルから順にシードする。
+    """
+    pool = list(CFG.get("CHROME_PROFILE_POOL", ["Default"])) or ["Default"]
+    profiles = pool[:count]
+    for i in range(len(pool), count):
+        name = f'auto_w{i}'
+        source = pool[i % len(pool)]
+        ud_dir = isolated_user_data_dir(name)
+        ensure_dir(ud_dir)
+        seed_isolated_profile(name, ud_dir, source_profile=source)
+        profiles.append(name)
+    if len(profiles) > len(pool):
+        logging.info(f'[並列] プロファイルを自動追加: {", ".join(profiles[len(pool):])}')
+    return profiles
+
+
+def _resolve_profile_pool(cfg: dict, task_count: int) -> list[str]:
+    requested = int(cfg.get("PARALLEL_WORKERS", 2))
+    profile_pool = list(cfg.get("CHROME_PROFILE_POOL", ["Default"]))
+    if not profile_pool:
+        profile_pool = ["Default"]
+    max_workers = size_worker_pool(requested, task_count)
+    if bool(cfg.get("AUTO_PROVISION_PROFILES", True)):
+        return provision_worker_profiles(max_workers)
+    return profile_pool[:max(1, min(max_workers, len(profile_pool)))]
+
+
+def _sleep_unless_stopped(sec: float):
+    t_end = time.time() + max(0.0, sec)
+    while time.time() < t_end:
+        if is_stopped():
+            return
+        time.sleep(min(0.5, t_end - time.time()))
+
+
+def _function1_worker(payload: dict):
+    global external_stop
+    # 通常はプールの initializer で済んでいる
+    _worker_bootstrap(None, '並列機能1ワーカー')
+    external_stop = payload.get("shared_stop")
 
     save_path = payload["save_path"]
     song_name, song_url = payload["song"]
     headless = payload["headless"]
     per_song_timeout = payload["per_song_timeout"]
-    skip_on_timeout = payload["skip_on_timeout"]
     profile_name = payload["profile_name"]
-    work_date_str = payload.get("work_date_str")
-    chromedriver_path = payload.get("chromedriver_path")
 
-    fatal = False
-    fatal_reason = ''
+    pace_sec = float(payload.get("pace_sec") or 0)
+    if pace_sec > 0:
+        logging.info(f'[並列機能1] Rate limiting対策: {pace_sec:.1f}秒待機 @ {profile_name}')
+        _sleep_unless_stopped(pace_sec)
 
-    try:
-        function2(save_path, [(song_name, song_url)], headless=headless, per_song_timeout=per_song_timeout,
-                  skip_on_timeout=skip_on_timeout, profile_name=profile_name, work_date_str=work_date_str,
-                  chromedriver_path=chromedriver_path)
-    except DriverInitFatalError as e:
-        logging.error(f'[並列ワーカー] Chrome起動致命的エラー: {song_name} | {e}')
-        fatal = True
-        fatal_reason = 'driver_init_failed'
+    res = {"song_name": song_name, "urls": 0, "ok": False, "elapsed_sec": 0,
+           "profile": profile_name, "fatal": False, "fatal_reason": ''}
+    if is_stopped():
+        return res
+
+    t0 = time.time()
+    driver = init_driver(headless=headless, per_song_timeout=per_song_timeout, for_function1=True,
+                         profile_name=profile_name, chromedriver_path=payload.get("chromedriver_path"))
+    if not driver:
+        logging.error(f'[並列機能1] Chrome起動致命的エラー: {song_name}')
+        res.update(fatal=True, fatal_reason='driver_init_failed')
         try:
             if external_stop is not None:
                 external_stop.set()
         except Exception:
             pass
+        return res
+
+    try:
+        count, ok = _function1_song(driver, save_path, payload["max_items"], song_name, song_url, per_song_timeout)
+        res.update(urls=count, ok=ok)
     except Exception as e:
         if _is_invalid_session_error(e):
-            logging.error(f'[並列ワーカー] セッションエラー(この曲のみ失敗): {song_name} | {e}')
-            fatal = False
-            fatal_reason = 'invalid_session'
+            logging.error(f'[並列機能1] セッションエラー(この曲のみ失敗): {song_name} | {e}')
+            res["fatal_reason"] = 'invalid_session'
         else:
-            logging.error(f'[並列ワーカー] 例外: {song_name} | {e}')
+            logging.error(f'[並列機能1] 例外: {song_name} | {e}', exc_info=True)
+    finally:
+        safe_quit(driver)
+        log_net_stats('並列機能1')
+    res["elapsed_sec"] = int(time.time() - t0)
+    return res
 
-    sanitized = sanitize_filename(song_name)
-    excel_filename = os.path.join(save_path, f'{sanitized}.xlsx')
-    total_urls = 0
-    filled = 0
-    date_key = work_date_str or datetime.now().strftime('%Y%m%d')
 
-    try:
-        if os.path.exists(excel_filename):
-            wb = load_workbook(excel_filename)
-            target_sheet = None
-            if date_key in wb.sheetnames:
-                target_sheet = wb[date_key]
-            else:
-                like_dates = [s for s in wb.sheetnames if re.fullmatch(r'\d{8}', s)]
-                if like_dates:
-                    like_dates.sort()
-                    target_sheet = wb[like_dates[-1]]
-            if target_sheet:
-                for row in target_sheet.iter_rows(min_row=2, max_col=12):
-                    link = row[10].value
-                    if link:
-                        total_urls += 1
-                        if all(cell.value not in (None, '') for cell in row[:10]) and row[11].value:
-                            filled += 1
-    except Exception as e:
-        logging.info(f'[並列ワーカー] 件数集計で例外: {e}')
+def function1_orchestrator(save_path, max_items, song_urls, headless=False,
+                           per_song_timeout: int = 300, skip_on_timeout: bool = False,
+                           profiles: list[str] | None = None, shared_stop=None,
+                           chromedriver_path: str | None = None, on_song_done=None):
+    """
+    機能1の並列実行。profiles / shared_stop / chromedriver_path を渡すと呼び出し側のものを使う
+    （パイプライン用）。on_song_done(曲名, URL) は曲のURL保存が終わるたびに呼ばれる。
+    """
+    logging.info('#機能1 開始 (並列オーケストレータ, timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
 
-    elapsed = 0
     try:
-        elapsed = int(payload.get("_tstart") and (time.time() - payload["_tstart"]) or 0)
-    except Exception:
-        pass
+        unique = _unique_songs(song_urls)
+        if not unique:
+            logging.warning('[並列機能1] 対象曲が0件です')
+            return
 
-    return {
-        "song_name": song_name, "total": total_urls, "filled": filled,
-        "elapsed_sec": elapsed, "profile": profile_name, "fatal": fatal, "fatal_reason": fatal_reason
-    }
+        if not chromedriver_path:
+            chromedriver_path = _preinstall_chromedriver()
+        if not profiles:
+            profiles = _resolve_profile_pool(CFG, len(unique))
+
+        # 実際に使う分離プロファイルごとに確認する（共通プロファイルが有効でも複製側は期限切れのことがある）
+        if bool(CFG.get("CHECK_LOGIN_BEFORE_START", True)):
+            if not _preflight_login_check(headless, per_song_timeout, profiles, chromedriver_path):
+                return
+        logging.info(f'[並列機能1] 開始: 対象{len(unique)}曲 同時{len(profiles)}ワーカー')
+
+        mgr = None
+        if shared_stop is None:
+            mgr, shared_stop = _new_shared_stop()
+        song_url_map = dict(unique)
+
+        song_interval_min = int(CFG.get("SONG_INTERVAL_MIN_SEC", 8))
+        song_interval_max = int(CFG.get("SONG_INTERVAL_MAX_SEC", 15))
+        max_consecutive_errors = int(CFG.get("MAX_CONSECUTIVE_ERRORS", 3))
+        long_wait_sec = int(CFG.get("LONG_WAIT_AFTER_ERRORS_SEC", 60))
+        # プロファイルごとに独立してペース配分する
+        prof_state = {p: {"served": 0, "errors": 0} for p in profiles}
+        results = []
+        failed_songs: list[str] = []
+        fatal_songs: list[str] = []
 
+        def make_payload(song, prof):
+            st = prof_state[prof]
+            pace = 0.0
+            if st["served"] > 0:
+                pace = random.uniform(song_interval_min, song_interval_max)
+            if st["errors"] >= max_consecutive_errors:
+                logging.warning(f'[並列機能1] {prof}: {st["errors"]}回連続でエラー → {long_wait_sec}秒の長い待機')
+                pace += long_wait_sec
+                st["errors"] = 0
+            st["served"] += 1
+            return {
+                "save_path": save_path, "max_items": max_items, "song": song, "headless": headless,
+                "per_song_timeout": per_song_timeout, "profile_name": prof, "shared_stop": shared_stop,
+                "pace_sec": pace, "chromedriver_path": chromedriver_path
+            }
+
+        def on_result(res, prof) -> bool:
+            results.append(res)
+            song_name = res.get("song_name")
+            if res.get("fatal"):
+                fatal_songs.append(song_name)
+                logging.error(f'[並列機能1] FATAL: {song_name} Chrome/セッションエラー({res.get("fatal_reason")})')
+                try:
+                    shared_stop.set()
+                except Exception:
+                    pass
+                return True
+            st = prof_state[prof]
+            st["errors"] = 0 if res.get("ok") else st["errors"] + 1
+            if not res.get("ok"):
+                failed_songs.append(song_name)
+            logging.info(f'[並列機能1] DONE: {song_name} URL件数: {res.get("urls", 0)} '
+                         f'所要: {res.get("elapsed_sec", 0)}s @ {prof}')
+            if on_song_done is not None:
+                on_song_done(song_name, song_url_map.get(song_name))
+            return False
 
-def function2_orchestrator(save_path, song_urls, headless=False,
-                           per_song_timeout: int = 300, skip_on_timeout: bool = False):
-    logging.info('#機能2 開始 (並列オーケストレータ, timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
+        _run_profile_pool('並列機能1', _function1_worker, unique, profiles, make_payload, on_result)
 
-    try:
-        try:
-            chromedriver_path = ChromeDriverManager().install()
-            logging.info(f'chromedriverをインストール/確認しました: {chromedriver_path}')
-        except Exception as e:
-            logging.error(f'chromedriverの事前インストールに失敗: {e}')
-            chromedriver_path = None
-
-        unique = []
-        seen = set()
-        for name, url in song_urls:
-            if name not in seen:
-                unique.append((name, url))
-                seen.add(name)
-        if not unique:
-            logging.warning('[並列] 対象曲が0件です')
-            return
+        if results:
+            logging.info(f'[並列機能1] 全体要約: URL {sum(r.get("urls", 0) for r in results)}件 （{len(results)}曲）')
+            if failed_songs:
+                logging.warning(f'[並列機能1] URL取得0件の曲: {", ".join(failed_songs)}')
+            if fatal_songs:
+                logging.error(f'[並列機能1] 中断曲: {", ".join(fatal_songs)}')
+        logging.info('[並列機能1] 終了')
+    finally:
+        logging.info('#機能1 終了')
 
-        cfg = CFG
-        max_workers = int(cfg.get("PARALLEL_WORKERS", 2))
-        profile_pool = list(cfg.get("CHROME_PROFILE_POOL", ["Default"]))
-        if not profile_pool:
-            profile_pool = ["Default"]
-        max_workers = max(1, min(max_workers, len(profile_pool), len(unique)))
 
-        logging.info(f'[並列] 開始: 対象{len(unique)}曲 同時{max_workers}ワーカー')
+class TaskFeed:
+    """
+    常駐ワーカーへ渡すタスクの受け口。別スレッドから put() で追加でき、
+    close() 後に空になったら終了とみなす。リストを渡した場合は最初から閉じている。
+    """
 
-        failed_songs_for_retry: list[str] = []
-        fatal_songs: list[str] = []
-        fatal_stop = False
-
-        from multiprocessing import Manager
-        mgr = Manager()
-        shared_stop = mgr.Event()
-        global external_stop
-        external_stop = shared_stop
-
-        work_date_str = datetime.now().strftime('%Y%m%d')
-        prof_deque = deque(profile_pool[:max_workers])
-        tasks_iter = iter(unique)
-        futures = {}
-        results = []
-        from concurrent.futures import CancelledError
+    def __init__(self, items=None):
+        self._items = deque(items or [])
+        self._closed = items is not None
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+    def get_nowait(self):
+        """
+        戻り値: 次のタスク（まだ届いていなければ None）。終了時は StopIteration
+        """
+        with self._lock:
+            if self._items:
+                return self._items.popleft()
+            if self._closed:
+                raise StopIteration
+            return None
 
-        with ProcessPoolExecutor(max_workers=max_workers) as ex:
-            while len(futures) < max_workers:
-                if is_stopped():
-                    break
-                try:
-                    song = next(tasks_iter)
-                except StopIteration:
-                    break
-                if not prof_deque:
-                    break
-                prof = prof_deque.popleft()
-                payload = {
-                    "save_path": save_path, "song": song, "headless": headless,
-                    "per_song_timeout": per_song_timeout, "skip_on_timeout": skip_on_timeout,
-                    "profile_name": prof, "shared_stop": shared_stop, "work_date_str": work_date_str,
-                    "_tstart": time.time(), "chromedriver_path": chromedriver_path
-                }
-                fut = ex.submit(_function2_worker, payload)
-                futures[fut] = prof
-                logging.info(f'[並列] START: {song[0]} @ {prof}')
-
-            while futures:
-                for fut in as_completed(list(futures.keys())):
-                    prof = futures.pop(fut)
-                    try:
-                        res = fut.result()
-                        if res:
-                            results.append(res)
-                            song_name = res.get("song_name")
-                            total = res.get("total", 0)
-                            filled = res.get("filled", 0)
-                            fatal = bool(res.get("fatal"))
-                            fatal_reason = (res.get("fatal_reason") or '')
-
-                            if fatal:
-                                fatal_stop = True
-                                fatal_songs.append(song_name)
-                                logging.error(f'[並列] FATAL: {song_name} Chrome/セッションエラー({fatal_reason})')
-                                try:
-                                    shared_stop.set()
-                                except Exception:
-                                    pass
-                            else:
-                                logging.info(f'[並列] DONE: {song_name} 件数: {filled}/{total} 所要: {res.get("elapsed_sec", 0)}s @ {prof}')
-                                if total > 0 and filled == 0:
-                                    failed_songs_for_retry.append(song_name)
-                    except CancelledError:
-                        logging.info(f'[並列] 取消 @ {prof}')
-                    except Exception as e:
-                        logging.error(f'[並列] ワーカー例外: {e}')
-
-                    prof_deque.append(prof)
-
-                    if is_stopped() or fatal_stop:
-                        continue
-                    try:
-                        song = next(tasks_iter)
-                    except StopIteration:
-                        continue
-                    if not prof_deque:
-                        continue
-                    prof2 = prof_deque.popleft()
-                    payload2 = {
-                        "save_path": save_path, "song": song, "headless": headless,
-                        "per_song_timeout": per_song_timeout, "skip_on_timeout": skip_on_timeout,
-                        "profile_name": prof2, "shared_stop": shared_stop, "work_date_str": work_date_str,
-                        "_tstart": time.time(), "chromedriver_path": chromedriver_path
-                    }
-                    fut2 = ex.submit(_function2_worker, payload2)
-                    futures[fut2] = prof2
-                    logging.info(f'[並列] START: {song[0]} @ {prof2}')
+    def exhausted(self) -> bool:
+        with self._lock:
+            return self._closed and not self._items
+
+
+class Function2Run:
+    """
+    並列機能2の1回分の状態（行範囲の統合待ち・所要時間履歴・結果集計）。
+    """
+
+    def __init__(self, save_path, headless: bool, per_song_timeout: int, shared_stop,
+                 chromedriver_path: str | None, work_date_str: str | None = None):
+        self.save_path = save_path
+        self.headless = headless
+        self.per_song_timeout = per_song_timeout
+        self.shared_stop = shared_stop
+        self.chromedriver_path = chromedriver_path
+        self.work_date_str = work_date_str or datetime.now().strftime('%Y%m%d')
+        self.chunk_rows = int(CFG.get("PARALLEL_CHUNK_ROWS", 300))
+        self.history = SongHistory()
+        DeadPostCache().compact()
+        recover_stale_journals(save_path, self.work_date_str)
+        self.pending_chunks: dict[str, list] = {}
+        self.chunk_totals: dict[str, list[int]] = {}
+        self.chunk_failures: dict[str, dict[str, int]] = {}
+        self.results: list[dict] = []
+        self.failed_songs_for_retry: list[str] = []
+        self.fatal_songs: list[str] = []
+        self.trace_run_id = new_trace_run_id()
+        self._lock = threading.Lock()
+
+    def plan_song(self, song_name: str, song_url: str) -> list[tuple]:
+        """
+        戻り値: [((曲名, URL, 行範囲), 見積もり秒), ...]
+        """
+        chunks = plan_song_chunks(self.save_path, song_name, self.work_date_str, self.chunk_rows)
+        if chunks[0][0] is not None:
+            with self._lock:
+                self.pending_chunks[song_name] = [r for r, _ in chunks]
+        return [((song_name, song_url, row_range), self.history.estimate(song_name, url_count))
+                for row_range, url_count in chunks]
+
+    def make_init(self, prof):
+        return {
+            "save_path": self.save_path, "headless": self.headless, "per_song_timeout": self.per_song_timeout,
+            "profile_name": prof, "shared_stop": self.shared_stop, "work_date_str": self.work_date_str,
+            "chromedriver_path": self.chromedriver_path, "trace_run_id": self.trace_run_id,
+            "log_queue": _log_queue
+        }
+
+    @staticmethod
+    def make_payload(task, prof):
+        song_name, song_url, row_range = task
+        return {"song": (song_name, song_url), "row_range": row_range, "_tstart": time.time()}
+
+    @staticmethod
+    def make_failure(payload, prof, reason: str) -> dict:
+        return _function2_task_result({"profile_name": prof}, payload, None, False, reason)
+
+    @staticmethod
+    def describe(task) -> str:
+        return task[0] if not task[2] else f'{task[0]} [{task[2][0]}-{task[2][1]}行]'
+
+    def _merge_chunks(self, song_name):
+        with self._lock:
+            ranges = self.pending_chunks.pop(song_name, [])
+        paths = [RowJournal.for_song(song_name, self.work_date_str, suffix=f'.r{a}-{b}').path for a, b in ranges]
+        try:
+            return merge_song_journals(self.save_path, song_name, self.work_date_str, paths)
+        except Exception as e:
+            logging.error(f'[並列] 統合で例外: {song_name} | {e}')
+            return None
+
+    def on_result(self, res, prof) -> bool:
+        song_name = res.get("song_name")
+        row_range = res.get("row_range")
+        if row_range and not res.get("fatal"):
+            # 行範囲タスクは曲の全範囲が揃った時点で1回だけブックへ反映する
+            logging.info(f'[並列] CHUNK: {song_name} [{row_range[0]}-{row_range[1]}行] '
+                         f'件数: {res.get("filled", 0)}/{res.get("total", 0)} @ {prof}')
+            acc = self.chunk_totals.setdefault(song_name, [0, 0])
+            acc[0] += 1
+            acc[1] += int(res.get("elapsed_sec", 0))
+            _merge_counts(self.chunk_failures.setdefault(song_name, {}), res.get("failures"))
+            # パイプラインでは plan_song が機能1のスレッドから pending_chunks を書き換える
+            with self._lock:
+                expected = len(self.pending_chunks.get(song_name, []))
+            if acc[0] < expected:
+                return False
+            merged = self._merge_chunks(song_name)
+            if not merged:
+                return False
+            res = dict(merged, elapsed_sec=acc[1], failures=self.chunk_failures.pop(song_name, {}))
+        self.results.append(res)
+        total = res.get("total", 0)
+        filled = res.get("filled", 0)
+        if not res.get("fatal") and not is_stopped():
+            self.history.record(song_name, res.get("elapsed_sec", 0), total)
+        if bool(res.get("fatal")):
+            self.fatal_songs.append(song_name)
+            logging.error(f'[並列] FATAL: {song_name} Chrome/セッションエラー({res.get("fatal_reason") or ""})')
+            try:
+                self.shared_stop.set()
+            except Exception:
+                pass
+            return True
+        failures = res.get("failures") or {}
+        logging.info(f'[並列] DONE: {song_name} 件数: {filled}/{total} 所要: {res.get("elapsed_sec", 0)}s @ {prof}'
+                     + (f' 失敗: {_format_counts(failures)}' if failures else ''))
+        if ((total > 0 and filled == 0) or failures.get('save_failed')
+                or any(failures.get(k) for k in _FUNCTION2_RETRY_FAILURES)):
+            self.failed_songs_for_retry.append(song_name)
+        return False
 
+    def run(self, feed, profiles: list[str]):
+        _run_resident_workers('並列', _function2_worker_loop, feed, profiles, self.make_init, self.make_payload,
+                              self.on_result, describe=self.describe, make_failure=self.make_failure,
+                              stop_event=self.shared_stop)
+
+    def finish(self):
+        # 中断などで範囲が揃わなかった曲も、取得済みの分はブックへ反映しておく
+        with self._lock:
+            song_names = list(self.pending_chunks)
+        for song_name in song_names:
+            merged = self._merge_chunks(song_name)
+            if merged:
+                self.results.append(dict(merged, failures=self.chunk_failures.pop(song_name, {})))
+        self.history.save()
+        log_trace_report(self.trace_run_id)
+
+        results = self.results
         if results:
             try:
                 total = sum(r.get("total", 0) for r in results)
                 filled = sum(r.get("filled", 0) for r in results)
                 logging.info(f'[並列] 全体要約: 埋まり {filled}/{total} （{len(results)}曲）')
+                failures: dict[str, int] = {}
+                timings: dict[str, float] = {}
+                for r in results:
+                    _merge_counts(failures, r.get("failures"))
+                    _merge_counts(timings, r.get("timings"))
+                if failures:
+                    logging.info(f'[並列] 失敗理由: {_format_counts(failures)}')
+                if timings:
+                    logging.info(f'[並列] 工程別所要(秒): {_format_counts({k: round(v, 1) for k, v in timings.items()})}')
             except Exception:
                 pass
-            if failed_songs_for_retry:
-                logging.warning(f'[並列] 要リトライ曲: {", ".join(failed_songs_for_retry)}')
-            if fatal_songs:
-                logging.error(f'[並列] 中断曲: {", ".join(fatal_songs)}')
+            if self.failed_songs_for_retry:
+                logging.warning(f'[並列] 要リトライ曲: {", ".join(self.failed_songs_for_retry)}')
+            if self.fatal_songs:
+                logging.error(f'[並列] 中断曲: {", ".join(self.fatal_songs)}')
+
+
+def _new_shared_stop():
+    from multiprocessing import Manager
+    mgr = Manager()
+    shared_stop = mgr.Event()
+    global external_stop
+    external_stop = shared_stop
+    return mgr, shared_stop
+
+
+def function2_orchestrator(save_path, song_urls, headless=False,
+                           per_song_timeout: int = 300, skip_on_timeout: bool = False):
+    logging.info('#機能2 開始 (並列オーケストレータ, timeout=%ss, skip_on_timeout=%s)', per_song_timeout, skip_on_timeout)
+
+    try:
+        chromedriver_path = _preinstall_chromedriver()
+
+        unique = _unique_songs(song_urls)
+        if not unique:
+            logging.warning('[並列] 対象曲が0件です')
+            return
+
+        mgr, shared_stop = _new_shared_stop()
+        run = Function2Run(save_path, headless, per_song_timeout, shared_stop, chromedriver_path)
+        planned = [p for song_name, song_url in unique for p in run.plan_song(song_name, song_url)]
+        tasks = [t for t, _ in planned]
+        estimates = [e for _, e in planned]
 
+        profiles = _resolve_profile_pool(CFG, len(tasks))
+        tasks, makespan = order_longest_first(tasks, estimates, len(profiles))
+        logging.info(f'[並列] 開始: 対象{len(unique)}曲 ({len(tasks)}タスク) 同時{len(profiles)}ワーカー')
+        logging.info(f'[並列] 予測所要: {int(makespan // 60)}分{int(makespan % 60)}秒 '
+                     f'(完了見込み {(datetime.now() + timedelta(seconds=makespan)).strftime("%H:%M")})')
+
+        run.run(TaskFeed(tasks), profiles)
+        run.finish()
         logging.info('[並列] 終了')
     finally:
         logging.info('#機能2 終了')
 
 
+def function12_pipeline(save_path, max_items, song_urls, headless=False,
+                        per_song_timeout: int = 300, skip_on_timeout: bool = False):
+    """
+    機能1と機能2をパイプラインで実行する。機能1でURL保存を終えた曲から順に
+    機能2のタスクへ回すので、URL収集と明細取得が別々のワーカーで同時に進む。
+    1つの曲のブックを書くのは常に一方だけ（機能1の保存が終わってから機能2に渡す）。
+    """
+    logging.info('#機能1+2 開始 (パイプライン, timeout=%ss)', per_song_timeout)
+    try:
+        unique = _unique_songs(song_urls)
+        if not unique:
+            logging.warning('[パイプライン] 対象曲が0件です')
+            return
+
+        chromedriver_path = _preinstall_chromedriver()
+        profiles = _resolve_profile_pool(CFG, len(unique) * 2)
+        if len(profiles) < 2:
+            logging.info('[パイプライン] ワーカーが2つ未満のため、機能1→機能2を順に実行します')
+            function1_orchestrator(save_path, max_items, unique, headless=headless,
+                                   per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+            if not is_stopped():
+                function2_orchestrator(save_path, unique, headless=headless,
+                                       per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+            return
+
+        n_f1 = max(1, min(int(CFG.get("PIPELINE_F1_WORKERS", 1)), len(profiles) - 1))
+        f1_profiles, f2_profiles = profiles[:n_f1], profiles[n_f1:]
+        logging.info(f'[パイプライン] 開始: 対象{len(unique)}曲 機能1={len(f1_profiles)}ワーカー '
+                     f'機能2={len(f2_profiles)}ワーカー')
+
+        mgr, shared_stop = _new_shared_stop()
+        run = Function2Run(save_path, headless, per_song_timeout, shared_stop, chromedriver_path)
+        feed = TaskFeed()
+
+        def on_song_done(song_name, song_url):
+            for task, _ in run.plan_song(song_name, song_url):
+                feed.put(task)
+            logging.info(f'[パイプライン] 機能2へ投入: {song_name}')
+
+        def f1_runner():
+            try:
+                function1_orchestrator(save_path, max_items, unique, headless=headless,
+                                       per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout,
+                                       profiles=f1_profiles, shared_stop=shared_stop,
+                                       chromedriver_path=chromedriver_path, on_song_done=on_song_done)
+            except Exception as e:
+                logging.error(f'[パイプライン] 機能1で例外: {e}', exc_info=True)
+            finally:
+                feed.close()
+
+        f1_thread = threading.Thread(target=f1_runner, daemon=True)
+        f1_thread.start()
+        try:
+            run.run(feed, f2_profiles)
+        finally:
+            f1_thread.join()
+            run.finish()
+        logging.info('[パイプライン] 終了')
+    finally:
+        logging.info('#機能1+2 終了')
+
+
+def run_function1_auto(save_path, max_items, song_urls, headless=False,
+                       per_song_timeout: int = 300, skip_on_timeout: bool = False):
+    if bool(CFG.get("PARALLEL_ENABLED", False)):
+        function1_orchestrator(save_path, max_items, song_urls, headless=headless,
+                               per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+    else:
+        function1(save_path, max_items, song_urls, headless=headless,
+                  per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+
+
+def run_function2_auto(save_path, song_urls, headless=False,
+                       per_song_timeout: int = 300, skip_on_timeout: bool = False):
+    if bool(CFG.get("PARALLEL_ENABLED", False)):
+        function2_orchestrator(save_path, song_urls, headless=headless,
+                               per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+    else:
+        function2(save_path, song_urls, headless=headless,
+                  per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+
+
+def run_function12_auto(save_path, max_items, song_urls, headless=False,
+                        per_song_timeout: int = 300, skip_on_timeout: bool = False):
+    if bool(CFG.get("PARALLEL_ENABLED", False)) and bool(CFG.get("PIPELINE_ENABLED", False)):
+        function12_pipeline(save_path, max_items, song_urls, headless=headless,
+                            per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+        return
+    run_function1_auto(save_path, max_items, song_urls, headless=headless,
+                       per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+    if is_stopped():
+        logging.info('#機能1+2 停止フラグ検知 → 機能2はスキップします')
+        return
+    run_function2_auto(save_path, song_urls, headless=headless,
+                       per_song_timeout=per_song_timeout, skip_on_timeout=skip_on_timeout)
+
+
 # === GUI ========================================================
 def create_gui():
+    import tkinter as tk
+    from tkinter import messagebox, scrolledtext
+
     stop_flag.clear()
 
     def _guard(fn, *args, **kwargs):
@@ -1985,7 +4631,7 @@ def create_gui():
         save_path, max_items, song_urls = read_initial_settings()
         if save_path and song_urls:
             timeout_cfg = int(CFG.get("PER_SONG_TIME_BUDGET_SEC", 300))
-            threading.Thread(target=lambda: _guard(function1, save_path, max_items, song_urls, False, timeout_cfg, True), daemon=True).start()
+            threading.Thread(target=lambda: _guard(run_function1_auto, save_path, max_items, song_urls, False, timeout_cfg, True), daemon=True).start()
 
     def run_function2():
         save_path, _, song_urls = read_initial_settings()
@@ -2017,16 +4663,7 @@ def create_gui():
             def runner():
                 try:
                     logging.info('#機能1+2 開始')
-                    function1(save_path, max_items, song_urls, headless=False, per_song_timeout=timeout_cfg, skip_on_timeout=True)
-
-                    if is_stopped():
-                        logging.info('#機能1+2 停止フラグ検知 → 機能2はスキップします')
-                        return
-
-                    if bool(CFG.get("PARALLEL_ENABLED", False)):
-                        function2_orchestrator(save_path, song_urls, headless=False, per_song_timeout=timeout_cfg, skip_on_timeout=True)
-                    else:
-                        function2(save_path, song_urls, headless=False, per_song_timeout=timeout_cfg, skip_on_timeout=True)
+                    run_function12_auto(save_path, max_items, song_urls, headless=False, per_song_timeout=timeout_cfg, skip_on_timeout=True)
                     logging.info('#機能1+2 終了')
                 except Exception as e:
                     logging.error(f'実行中にエラー: {e}', exc_info=True)
@@ -2063,10 +4700,11 @@ def create_gui():
     tk.Button(root, text='停止', command=run_stop).grid(row=1, column=3, padx=5)
     tk.Button(root, text='機能1 + 機能2', command=run_function1_and_2).grid(row=1, column=4, padx=5)
 
-    text_handler = TextHandler(text_area, log_display_var)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    text_handler.setFormatter(formatter)
-    logging.getLogger().addHandler(text_handler)
+    text_handler = TextHandler(text_area, log_display_var, max_lines=int(CFG.get("GUI_LOG_MAX_LINES", 5000)),
+                               drain_ms=int(CFG.get("GUI_LOG_DRAIN_MS", 200)))
+    text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    add_log_handler(text_handler)
+    text_handler.start()
 
     root.mainloop()
 
@@ -2083,6 +4721,7 @@ def slice_song_range(song_urls, offset: int | None, limit: int | None):
 def run_cli_with_split(settings_path: str | None, offset: int, limit: int,
                        per_song_timeout: int, skip_on_timeout: bool, headless: bool):
     save_path, max_items, song_urls = read_initial_settings(settings_path)
+    report_startup('メイン')
     if save_path and song_urls:
         targets = slice_song_range(song_urls, offset, limit)
         if not targets:
@@ -2096,16 +4735,14 @@ def run_cli_with_split(settings_path: str | None, offset: int, limit: int,
         except Exception:
             pass
 
-        function1(save_path, max_items, targets, headless=headless, per_song_timeout=effective_timeout, skip_on_timeout=skip_on_timeout)
-
-        if bool(CFG.get("PARALLEL_ENABLED", False)):
-            function2_orchestrator(save_path, targets, headless=headless, per_song_timeout=effective_timeout, skip_on_timeout=skip_on_timeout)
-        else:
-            function2(save_path, targets, headless=headless, per_song_timeout=effective_timeout, skip_on_timeout=skip_on_timeout)
+        run_function12_auto(save_path, max_items, targets, headless=headless, per_song_timeout=effective_timeout, skip_on_timeout=skip_on_timeout)
 
         logging.info("自動実行が完了しました。")
 
 
+_IMPORT_SEC = time.perf_counter() - _IMPORT_T0
+
+
 if __name__ == '__main__':
     try:
         from multiprocessing import freeze_support
@@ -2113,6 +4750,8 @@ if __name__ == '__main__':
     except Exception:
         pass
 
+    _bootstrap()
+
     try:
         kill_chrome_processes()
     except Exception as e:
@@ -2129,7 +4768,11 @@ if __name__ == '__main__':
         parser.add_argument('--per-song-timeout', type=int, default=300)
         parser.add_argument('--skip-on-timeout', action='store_true')
         parser.add_argument('--headless', action='store_true')
+        parser.add_argument('--startup-profile', action='store_true',
+                            help='起動時間とワーカーごとの初期化時間をログに出す')
         args = parser.parse_args(sys.argv[2:])
+        if args.startup_profile:
+            os.environ['TIKTOK_STARTUP_PROFILE'] = '1'
 
         headless_flag = args.headless or service_mode
         if service_mode and not args.headless:
@@ -25,6 +25,7 @@ from modules.excel_utils import (
     find_failed_entries,
 )
 from modules.scraper import get_ugc_count, initialize_driver
+from tiktok_shared.net_blocking import collect_stats, format_stats
 from modules.logger import setup_logging
 from modules.constants import (
     UGC_SHEET_NAME,
@@ -424,7 +425,8 @@ def collect_mode(settings_xlsx: Path | None,
                  shards: int, shard_index: int, out_csv: str,
                  profile_dir: str | None = None, timeout: int = 15, retries: int = 3,
                  headless: bool = True, disable_images: bool = True,
-                 master_xlsx: Path | None = None, master_sheet: str = "楽曲マスタ"):
+                 master_xlsx: Path | None = None, master_sheet: str = "楽曲マスタ",
+                 block_stats: bool = False, proxy_server: str | None = None):
     """
     settings_xlsx が与えられれば従来の initial_settings.xlsx を使用。
     master_xlsx が与えられれば UGC の「楽曲マスタ」から読み込む（優先）。
@@ -458,7 +460,9 @@ def collect_mode(settings_xlsx: Path | None,
     try:
         driver = initialize_driver(profile_dir=profile_dir,
                                    headless=headless,
-                                   disable_images=disable_images)
+                                   disable_images=disable_images,
+                                   block_stats=block_stats,
+                                   proxy_server=proxy_server)
         logging.info("WebDriverを正常に初期化しました。（collect）")
     except WebDriverException as e:
         logging.error("WebDriver初期化に失敗: %s", e)
@@ -473,6 +477,7 @@ def collect_mode(settings_xlsx: Path | None,
             except Exception as e:
                 logging.error("[collect] 取得中エラー: %s", e)
                 ugc = None
+            collect_stats(driver)
 
             ts = datetime.now().isoformat(timespec="seconds")
             row = {
@@ -489,6 +494,8 @@ def collect_mode(settings_xlsx: Path | None,
         except Exception:
             pass
         logging.info("WebDriverを終了しました。（collect）")
+        if block_stats:
+            logging.info("通信量（工程別）: %s", format_stats() or "記録なし")
 
 # ==== apply_mode（恒久対策） ====
 def apply_mode(target_xlsx: Path, csv_inputs: list[str]):
@@ -599,6 +606,8 @@ def main():
     parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="リトライ回数（collect時）")
     parser.add_argument("--no-headless", action="store_true", help="ヘッドレス無効（デバッグ用）")
     parser.add_argument("--enable-images", action="store_true", help="画像読み込みを有効化")
+    parser.add_argument("--proxy-server", default=None, help="Chromeが使うプロキシ（例: http://127.0.0.1:3128）")
+    parser.add_argument("--block-stats", action="store_true", help="工程別の通信量・ブロック数を集計してログに出す")
 
     # apply
     parser.add_argument("--in", dest="csv_inputs", nargs="*", default=[], help="適用対象CSV（複数/ワイルドカード可）")
@@ -635,6 +644,8 @@ def main():
             disable_images=(not args.enable_images),
             master_xlsx=master_path,
             master_sheet=args.master_sheet,
+            block_stats=args.block_stats,
+            proxy_server=args.proxy_server,
         )
         logging.info("スクリプトの実行を終了します。")
         return
@@ -0,0 +1,8 @@
+# modules/__init__.py
+# tiktok_toolkit と共有するモジュール（リポジトリ直下の tiktok_shared/）を import できるようにする
+import os
+import sys
+
+_SHARED_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+if _SHARED_ROOT not in sys.path:
+    sys.path.append(_SHARED_ROOT)
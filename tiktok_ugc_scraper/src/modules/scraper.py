@@ -13,8 +13,9 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 
+from tiktok_shared.driver_resolver import resolve_chromedriver
+from tiktok_shared.net_blocking import apply_blocking, enable_perf_logging
 from modules.parsing_utils import parse_number
 from modules.constants import UGC_COUNT_XPATH, WEBDRIVER_WAIT_TIME
 
@@ -104,13 +105,19 @@ def initialize_driver(
     headless: bool = True,
     disable_images: bool = True,
     user_agent: str | None = None,
+    block_phase: str | None = "ugc_count",
+    block_stats: bool = False,
+    proxy_server: str | None = None,
 ):
     """
     Selenium WebDriver を初期化（CLI/GUI 共用・並列起動に強い版）。
 
     - profile_dir を指定するとそのプロファイルで起動。起動に失敗した場合は
-      自動的に <profile_dir>_clean のクリーンプロファイルへフォールバック。
+      自動的に <profile_dir>_clean のクリーンプロファイルへフォールバック（/dev/shm があればその下に作成）。
     - 画像 OFF/ヘッドレス/UA などの基本オプションも設定。
+    - block_phase の工程ポリシーで不要なリクエスト（動画・フォント・解析ビーコン等）をCDPでブロック
+      （None でブロックなし）。block_stats=True で工程別の通信量を集計（net_blocking.collect_stats）。
+    - proxy_server を指定すると全リクエストをそのプロキシ経由にする（例: http://127.0.0.1:3128）。
     """
     def _make_options(pdir: str | None) -> Options:
         o = Options()
@@ -130,6 +137,10 @@ def initialize_driver(
         o.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
         o.add_argument("--remote-debugging-port=0")  # ポート衝突の回避
         o.page_load_strategy = "eager"
+        if block_stats:
+            enable_perf_logging(o)
+        if proxy_server:
+            o.add_argument(f"--proxy-server={proxy_server}")
 
         # プロファイル
         if pdir:
@@ -151,11 +162,18 @@ def initialize_driver(
             )
         return o
 
+    driver_path = resolve_chromedriver()
+
     def _launch_with(pdir: str | None):
-        return webdriver.Chrome(
-            service=ChromeService(ChromeDriverManager().install()),
+        drv = webdriver.Chrome(
+            service=ChromeService(executable_path=driver_path),
             options=_make_options(pdir),
         )
+        if block_phase:
+            # 画像ONの指定時は画像パターンをブロックしない
+            apply_blocking(drv, block_phase, allow_groups=() if disable_images else ("images",),
+                           stats=block_stats)
+        return drv
 
     # --- 1st try: 指定プロファイルで起動
     try:
@@ -175,7 +193,12 @@ def initialize_driver(
     clean_dir = None
     try:
         if profile_dir:
-            clean_dir = str(Path(profile_dir).with_name(Path(profile_dir).name + "_clean"))
+            clean_name = Path(profile_dir).name + "_clean"
+            # 使い捨てなので、使えるならRAM上（/dev/shm）に作って起動を速くする
+            if Path("/dev/shm").is_dir():
+                clean_dir = str(Path("/dev/shm/tiktok_ugc_profiles") / clean_name)
+            else:
+                clean_dir = str(Path(profile_dir).with_name(clean_name))
             shutil.rmtree(clean_dir, ignore_errors=True)
             Path(clean_dir).mkdir(parents=True, exist_ok=True)
         drv = _launch_with(clean_dir)